@@ -1,5 +1,6 @@
 import logging
 
+import numpy as np
 from tqdm import tqdm
 
 log = logging.getLogger(__name__)
@@ -39,6 +40,7 @@ class Arena:
         players = [self.player2, None, self.player1]
         curPlayer = 1
         board = self.game.getInitBoard()
+        canonical = np.empty_like(board)  # canonical form given to the players, rewritten every turn
         it = 0
         while self.game.getGameEnded(board, curPlayer) == 0:
             it += 1
@@ -52,7 +54,7 @@ class Arena:
             try:
                 action = players[curPlayer + 1](board, curPlayer)
             except TypeError:
-                action = players[curPlayer + 1](board * curPlayer)
+                action = players[curPlayer + 1](self.game.getCanonicalForm(board, curPlayer, out=canonical))
 
             board, curPlayer = self.game.getNextState(board, curPlayer, action)
         if verbose:
@@ -3,6 +3,8 @@ import math
 
 import numpy as np
 
+from core_game.EvaluationCache import SEARCH_CACHE_BYTES, SymmetricEvaluator
+
 EPS = 1e-8
 
 log = logging.getLogger(__name__)
@@ -24,6 +26,8 @@ class MCTS():
 
         self.Es = {}  # stores game.getGameEnded ended for board s
         self.Vs = {}  # stores game.getValidMoves for board s
+        # nnet through a symmetry cache (args.evalCacheBytes): the 8 symmetric variants of a leaf share one call.
+        self.evaluator = SymmetricEvaluator.of(game, nnet, args.get('evalCacheBytes', SEARCH_CACHE_BYTES))
 
     def getActionProb(self, canonicalBoard, temp=1):
         """
@@ -52,7 +56,7 @@ class MCTS():
         probs = [x / counts_sum for x in counts]
         return probs
 
-    def search(self, canonicalBoard):
+    def search(self, canonicalBoard, s=None, occupancy=None):
         """
         This function performs one iteration of MCTS. It is recursively called
         till a leaf node is found. The action chosen at each node is one that
@@ -64,26 +68,35 @@ class MCTS():
         outcome is propagated up the search path. The values of Ns, Nsa, Qsa are
         updated.
 
+        canonicalBoard is modified during the search and restored before it
+        returns.
+
         NOTE: the return values are the negative of the value of the current
         state. This is done since v is in [-1,1] and if v is the value of a
         state for the current player, then its value is -v for the other player.
 
+        s is the key of canonicalBoard when the caller already has it (it is
+        passed down the recursion, updated from each move instead of rehashed),
+        and occupancy the key of its occupied squares (game.getOccupancy), kept
+        up to date the same way.
+
         Returns:
             v: the negative of the value of the current canonicalBoard
         """
 
-        s = self.game.stringRepresentation(canonicalBoard)
+        if s is None:
+            s = self.game.stringRepresentation(canonicalBoard)
 
         if s not in self.Es:
-            self.Es[s] = self.game.getGameEnded(canonicalBoard, 1)
+            self.Es[s] = self.game.getGameEnded(canonicalBoard, 1, key=s)
         if self.Es[s] != 0:
             # terminal node
             return -self.Es[s]
 
         if s not in self.Ps:
             # leaf node
-            self.Ps[s], v = self.nnet.predict(canonicalBoard)
-            valids = self.game.getValidMoves(canonicalBoard, 1)
+            self.Ps[s], v = self.evaluator.predict(canonicalBoard)
+            valids = self.game.getValidMoves(canonicalBoard, 1, key=s)
             self.Ps[s] = self.Ps[s] * valids  # masking invalid moves
             sum_Ps_s = np.sum(self.Ps[s])
             if sum_Ps_s > 0:
@@ -119,10 +132,20 @@ class MCTS():
                     best_act = a
 
         a = best_act
-        next_s, next_player = self.game.getNextState(canonicalBoard, 1, a)
-        next_s = self.game.getCanonicalForm(next_s, next_player)
 
-        v = self.search(next_s)
+        # Descend on the same board: play the move in place and flip the colors to get the canonical form of
+        # the next position, then restore the board once the recursion returns.
+        if occupancy is None:
+            occupancy = self.game.getOccupancy(canonicalBoard)
+        undo = self.game.makeMove(canonicalBoard, 1, a)
+        next_occupancy = self.game.getMoveOccupancy(occupancy, undo)
+        next_key = self.game.getCanonicalHash(canonicalBoard, -1, self.game.getMoveHash(s, undo), next_occupancy)
+        self.game.getCanonicalForm(canonicalBoard, -1, out=canonicalBoard)
+        try:
+            v = self.search(canonicalBoard, next_key, next_occupancy)
+        finally:
+            self.game.getCanonicalForm(canonicalBoard, -1, out=canonicalBoard)
+            self.game.unmakeMove(canonicalBoard, undo)
 
         if (s, a) in self.Qsa:
             self.Qsa[(s, a)] = (self.Nsa[(s, a)] * self.Qsa[(s, a)] + v) / (self.Nsa[(s, a)] + 1)
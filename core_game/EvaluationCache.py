@@ -0,0 +1,79 @@
+import numpy as np
+
+from core_game.TranspositionTable import TranspositionTable
+
+# Memory cap of the symmetry cache of one search (MCTS tree or RHEA population), unless its args set one.
+SEARCH_CACHE_BYTES = 16 * 2 ** 20
+
+
+class EvaluationCache(TranspositionTable):
+    """
+    Size-bounded LRU map from symmetry-canonical position keys
+    (Game.getCanonicalSymmetry) to network evaluations (pi, v) of the canonical
+    variant. Boards evaluated before, by a sibling RHEA individual, an earlier
+    generation or another search, are served without a forward pass. The owner
+    clears it whenever the weights change, so stale evaluations are never served.
+    """
+
+    # Approximate memory held by one entry (dict slot, key, policy array and value).
+    ENTRY_BYTES = 1024
+
+    def __init__(self, max_bytes=64 * 2 ** 20):
+        super().__init__(max_bytes)
+
+    def evaluate(self, game, boards, forward):
+        """
+        boards: (B, n, n) np array of boards
+        forward: evaluates a (M, n, n) stack of boards, returning (M, action_size) policies and (M,) values
+        Looks boards up by their symmetry-canonical key; the misses are evaluated with one forward call in their
+        canonical orientation (a position met in several orientations once) and every policy is mapped back to
+        the orientation of its board.
+        returns (B, action_size) policies, (B,) values and the number of boards that were not in the cache
+        """
+        pis = np.empty((len(boards), game.getActionSize()), dtype=np.float32)
+        vs = np.empty(len(boards), dtype=np.float32)
+        misses = {}  # key -> (canonical board, [(index, symmetry)])
+        for i, board in enumerate(boards):
+            key, sym_board, t = game.getCanonicalSymmetry(board)
+            entry = self.get(key) if key not in misses else None
+            if entry is None:
+                misses.setdefault(key, (sym_board, []))[1].append((i, t))
+            else:
+                pis[i] = game.untransformPolicy(entry[0], t)
+                vs[i] = entry[1]
+        if misses:
+            out_pis, out_vs = forward(np.stack([sym_board for sym_board, _ in misses.values()]))
+            for j, (key, (_, positions)) in enumerate(misses.items()):
+                self.put(key, (np.array(out_pis[j]), np.ravel(out_vs)[j]))
+                for i, t in positions:
+                    pis[i] = game.untransformPolicy(out_pis[j], t)
+                    vs[i] = np.ravel(out_vs)[j]
+        return pis, vs, sum(len(positions) for _, positions in misses.values())
+
+
+class SymmetricEvaluator:
+    """
+    predict and predict_batch of nnet through an EvaluationCache of its own, used by the searches (MCTS, RHEA),
+    so the 8 symmetric variants of a position cost one evaluation. nnet itself is used as is when it already has
+    a cache (NNetWrapper with args.eval_cache_bytes).
+    """
+
+    def __init__(self, game, nnet, max_bytes=SEARCH_CACHE_BYTES):
+        self.game = game
+        self.nnet = nnet
+        self.cache = EvaluationCache(max_bytes)
+
+    @staticmethod
+    def of(game, nnet, max_bytes=SEARCH_CACHE_BYTES):
+        """ nnet if it caches its evaluations itself (or max_bytes is 0), otherwise a SymmetricEvaluator of it. """
+        if not max_bytes or getattr(nnet, 'cache', None) is not None:
+            return nnet
+        return SymmetricEvaluator(game, nnet, max_bytes)
+
+    def predict(self, board):
+        pis, vs = self.predict_batch(np.asarray(board)[np.newaxis])
+        return pis[0], vs[:1]
+
+    def predict_batch(self, boards):
+        pis, vs, _ = self.cache.evaluate(self.game, boards, self.nnet.predict_batch)
+        return pis, vs
@@ -46,11 +46,45 @@ class Game():
         """
         pass
 
-    def getValidMoves(self, board, player):
+    def makeMove(self, board, player, action):
+        """
+        Input:
+            board: current board, modified in place
+            player: current player (1 or -1)
+            action: action taken by current player
+
+        Returns:
+            undo: record of the changes, for unmakeMove and getMoveHash.
+                  board now holds the position getNextState would return.
+        """
+        pass
+
+    def unmakeMove(self, board, undo):
+        """
+        Input:
+            board: board a move was played on with makeMove, modified in place
+            undo: the record makeMove returned; moves are undone in reverse order
+        """
+        pass
+
+    def getMoveHash(self, h, undo):
+        """
+        Input:
+            h: getHash of the position the move of undo was played from
+            undo: record returned by makeMove
+
+        Returns:
+            key: getHash of the position after the move
+        """
+        pass
+
+    def getValidMoves(self, board, player, key=None):
         """
         Input:
             board: current board
             player: current player
+            key: optional getHash(board, player), lets cached results be
+                 looked up without rehashing the board
 
         Returns:
             validMoves: a binary vector of length self.getActionSize(), 1 for
@@ -59,11 +93,12 @@ class Game():
         """
         pass
 
-    def getGameEnded(self, board, player):
+    def getGameEnded(self, board, player, key=None):
         """
         Input:
             board: current board
             player: current player (1 or -1)
+            key: optional getHash(board, player)
 
         Returns:
             r: 0 if game has not ended. 1 if player won, -1 if player lost,
@@ -72,11 +107,13 @@ class Game():
         """
         pass
 
-    def getCanonicalForm(self, board, player):
+    def getCanonicalForm(self, board, player, out=None):
         """
         Input:
             board: current board
             player: current player (1 or -1)
+            out: optional board the canonical form is written to (out=board
+                 converts in place)
 
         Returns:
             canonicalBoard: returns canonical form of board. The canonical form
@@ -101,13 +138,99 @@ class Game():
         """
         pass
 
+    def getCanonicalSymmetry(self, board):
+        """
+        Input:
+            board: current board
+
+        Returns:
+            key: an int key shared by all symmetric forms of board
+            symBoard: the symmetric form of board the key belongs to
+            t: index of the symmetry mapping board to symBoard
+        """
+        pass
+
+    def untransformPolicy(self, pi, t):
+        """
+        Input:
+            pi: policy vector for the symmetric form t of a board
+            t: symmetry index returned by getCanonicalSymmetry
+
+        Returns:
+            pi: the same policy expressed for the original board
+        """
+        pass
+
     def stringRepresentation(self, board):
         """
         Input:
             board: current board
 
         Returns:
-            boardString: a quick conversion of board to a string format.
-                         Required by MCTS for hashing.
+            boardString: a quick conversion of board to a hashable key (a string
+                         or an int). Required by MCTS for hashing; must equal
+                         getHash(board, 1).
+        """
+        pass
+
+    def getHash(self, board, player=1):
+        """
+        Input:
+            board: current board
+            player: player to move (1 or -1)
+
+        Returns:
+            key: an int key of the position (board and player to move).
+        """
+        pass
+
+    def getNextStateHash(self, board, player, action, h):
+        """
+        Input:
+            board: current board
+            player: current player (1 or -1)
+            action: action taken by current player
+            h: getHash(board, player)
+
+        Returns:
+            nextBoard, nextPlayer: as returned by getNextState
+            nextKey: getHash(nextBoard, nextPlayer), updated incrementally
+        """
+        pass
+
+    def getCanonicalHash(self, board, player, h, occupancy=None):
+        """
+        Input:
+            board: current board
+            player: current player (1 or -1)
+            h: getHash(board, player)
+            occupancy: optional getOccupancy(board), lets the key be
+                       updated without rehashing the board
+
+        Returns:
+            key: getHash(getCanonicalForm(board, player), 1)
+        """
+        pass
+
+    def getOccupancy(self, board):
+        """
+        Input:
+            board: current board
+
+        Returns:
+            occupancy: an int key of the occupied squares of board, for
+                       getCanonicalHash
+        """
+        pass
+
+    def getMoveOccupancy(self, occupancy, undo):
+        """
+        Input:
+            occupancy: getOccupancy of the position the move of undo was
+                       played from
+            undo: record returned by makeMove
+
+        Returns:
+            occupancy: getOccupancy of the position after the move
         """
         pass
@@ -0,0 +1,130 @@
+import queue
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class InferenceServer:
+    """
+    Coalesces predict calls of many concurrent searches (threads running MCTS
+    trees or RHEA populations) into batched forward passes.
+    A caller's predict blocks while its board waits in a queue; a server thread
+    collects queued boards until max_batch_size boards are waiting or the oldest
+    one has waited max_wait_us microseconds, evaluates them with one
+    nnet.predict_batch call and hands each caller its own result.
+    predict has the signature of NNetWrapper.predict, so the server can be given
+    to MCTS or RHEAPopulation in place of the network. Only the server thread
+    runs the network: do not call nnet.predict directly while the server runs.
+    """
+
+    def __init__(self, nnet, max_batch_size=64, max_wait_us=500, latency_samples=100000):
+        self.nnet = nnet
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_us / 1e6
+        self.requests = queue.Queue()
+        self.lock = threading.Lock()  # no request is queued after the stop sentinel of close.
+
+        self.batch_sizes = Counter()  # batch size -> number of forward passes of that size
+        self.queue_latency = deque(maxlen=latency_samples)  # seconds each request waited for its forward pass
+        self.requests_served = 0
+
+        self.thread = None
+        self.closed = True
+        self.start()
+
+    def start(self):
+        """ Starts the server thread (done by the constructor; restarts a closed server). """
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.closed = False
+                self.thread = threading.Thread(target=self._serve, name='InferenceServer', daemon=True)
+                self.thread.start()
+
+    def close(self):
+        """ Serves the requests already queued, then stops the server thread; later submits raise RuntimeError. """
+        with self.lock:
+            self.closed = True
+            if self.thread is None or not self.thread.is_alive():
+                return
+            self.requests.put(None)
+        self.thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def submit(self, board):
+        """ Queues board for evaluation; returns a Future resolving to its (pi, v). """
+        future = Future()
+        with self.lock:
+            if self.closed:  # nothing would ever serve the request.
+                raise RuntimeError('InferenceServer is closed')
+            self.requests.put((board, future, time.perf_counter()))
+        return future
+
+    def predict(self, board):
+        """
+        board: np array with board (canonical form)
+        Blocks until the batch holding board is evaluated and returns its pi and v, as NNetWrapper.predict does.
+        """
+        return self.submit(board).result()
+
+    def predict_batch(self, boards):
+        """ Queues every board of a (B, n, n) stack and returns the (B, actions) policies and (B,) values. """
+        results = [future.result() for future in [self.submit(board) for board in boards]]
+        pis, vs = zip(*results)
+        return np.stack(pis), np.concatenate(vs)
+
+    def _collect(self, first):
+        """ Batch of requests starting with first: waits for more until the size limit or first's deadline. """
+        batch = [first]
+        deadline = first[2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            try:
+                request = self.requests.get(timeout=timeout) if timeout > 0 else self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:  # close(): serve this batch, then stop.
+                self.requests.put(None)
+                break
+            batch.append(request)
+        return batch
+
+    def _serve(self):
+        while True:
+            request = self.requests.get()
+            if request is None:
+                return
+            batch = self._collect(request)
+
+            start = time.perf_counter()
+            self.batch_sizes[len(batch)] += 1
+            self.queue_latency.extend(start - submitted for _, _, submitted in batch)
+            self.requests_served += len(batch)
+            try:
+                pis, vs = self.nnet.predict_batch(np.stack([board for board, _, _ in batch]))
+            except Exception as e:  # the callers get the error, the server keeps running.
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            for i, (_, future, _) in enumerate(batch):
+                future.set_result((pis[i], vs[i:i + 1]))
+
+    def stats(self):
+        """ Batch-size distribution and queueing latency (microseconds) of the requests served so far. """
+        batches = sum(self.batch_sizes.values())
+        latency = np.array(self.queue_latency) * 1e6
+        percentiles = np.percentile(latency, [50, 90, 99]) if len(latency) else [0.0, 0.0, 0.0]
+        return {'requests': self.requests_served, 'batches': batches,
+                'mean_batch_size': self.requests_served / batches if batches else 0.0,
+                'batch_sizes': dict(sorted(self.batch_sizes.items())),
+                'queue_us_mean': float(latency.mean()) if len(latency) else 0.0,
+                'queue_us_p50': float(percentiles[0]), 'queue_us_p90': float(percentiles[1]),
+                'queue_us_p99': float(percentiles[2]),
+                'queue_us_max': float(latency.max()) if len(latency) else 0.0}
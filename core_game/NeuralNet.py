@@ -36,6 +36,47 @@ class NeuralNet:
         """
         pass
 
+    def predict_batch(self, boards):
+        """
+        Evaluates several boards with one forward pass.
+
+        Input:
+            boards: array of B boards, each in its canonical form.
+
+        Returns:
+            pis: a (B, game.getActionSize) array with the policy of each board
+            vs: a (B,) array with the value of each board
+        """
+        pass
+
+    def flush_metrics(self):
+        """
+        Writes the inference metrics aggregated since the last call (e.g. to
+        TensorBoard) and resets them. Called once per Coach iteration; networks
+        without metrics can ignore it.
+        """
+        pass
+
+    def snapshot(self):
+        """
+        Returns an in-memory copy of the parameters, to be given to restore.
+        """
+        pass
+
+    def restore(self, snapshot):
+        """
+        Loads parameters taken by snapshot.
+        """
+        pass
+
+    def share_weights(self, other):
+        """
+        Uses the parameters of the network other without copying them,
+        until either network changes its parameters (e.g. by training).
+        The Coaches use it to keep the previous network of an iteration.
+        """
+        pass
+
     def save_checkpoint(self, folder, filename):
         """
         Saves the current neural network (with its parameters) in
@@ -0,0 +1,112 @@
+from collections import Counter
+
+
+class LatencyHistogram:
+    """
+    HDR-style histogram of durations. Values (in microseconds) fall in
+    log-linear buckets: exact below SUB_BUCKETS, then SUB_BUCKETS buckets per
+    power of two, so any quantile is known within 1/SUB_BUCKETS of its value
+    while memory stays bounded by the number of distinct buckets (~16 per octave).
+    """
+
+    SUB_BUCKETS = 16
+
+    def __init__(self):
+        self.buckets = Counter()
+        self.count = 0
+        self.total = 0.0  # seconds
+        self.max = 0.0    # seconds
+
+    def record(self, seconds):
+        us = int(seconds * 1e6)
+        if us < self.SUB_BUCKETS:
+            bucket = us
+        else:
+            shift = us.bit_length() - self.SUB_BUCKETS.bit_length()
+            bucket = self.SUB_BUCKETS * (shift + 1) + (us >> shift) - self.SUB_BUCKETS
+        self.buckets[bucket] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def _bucket_value(self, bucket):
+        """ Midpoint (microseconds) of the values falling in bucket. """
+        if bucket < self.SUB_BUCKETS:
+            return float(bucket)
+        shift, top = divmod(bucket - self.SUB_BUCKETS, self.SUB_BUCKETS)
+        return ((self.SUB_BUCKETS + top) << shift) + ((1 << shift) - 1) / 2
+
+    def percentile(self, q):
+        """ Value (microseconds) below which q percent of the recorded durations lie. """
+        if self.count == 0:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(self._bucket_value(bucket), self.max * 1e6)
+        return self.max * 1e6
+
+    def mean(self):
+        """ Mean duration in microseconds. """
+        return self.total / self.count * 1e6 if self.count else 0.0
+
+
+class Telemetry:
+    """
+    In-memory metrics of a hot path: counters and latency histograms are only
+    aggregated in memory and written to TensorBoard by flush (once per Coach
+    iteration, or automatically every flush_every recorded durations), instead of
+    one event per call. Every flush is written at the number of durations recorded
+    so far, the one step axis of all the tags. With enabled=False callers skip the
+    timing entirely.
+    """
+
+    QUANTILES = (50, 90, 99)
+
+    def __init__(self, writer=None, enabled=True, flush_every=0):
+        self.writer = writer
+        self.enabled = enabled
+        self.flush_every = flush_every  # 0: flushed by the owner only.
+        self.counters = Counter()
+        self.histograms = {}
+        self.records = 0  # durations recorded since the last flush
+        self.step = 0     # durations recorded in total
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def record(self, name, seconds):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = LatencyHistogram()
+        histogram.record(seconds)
+        self.records += 1
+        self.step += 1
+        if self.flush_every and self.records >= self.flush_every:
+            self.flush()
+
+    def summary(self):
+        """ Dict of the counters and, per histogram, its count, mean, quantiles and max (microseconds). """
+        summary = dict(self.counters)
+        for name, histogram in self.histograms.items():
+            summary[name + '/count'] = histogram.count
+            summary[name + '/mean_us'] = histogram.mean()
+            for q in self.QUANTILES:
+                summary['{}/p{}_us'.format(name, q)] = histogram.percentile(q)
+            summary[name + '/max_us'] = histogram.max * 1e6
+        return summary
+
+    def flush(self):
+        """
+        Writes the summary of the metrics gathered since the last flush to the writer (at self.step), then resets
+        them.
+        """
+        if self.writer is not None:
+            for tag, value in self.summary().items():
+                self.writer.add_scalar(tag, value, self.step)
+        self.counters.clear()
+        self.histograms.clear()
+        self.records = 0
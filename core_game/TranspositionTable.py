@@ -0,0 +1,80 @@
+import threading
+from collections import OrderedDict, namedtuple
+
+# Cached rule queries of one position (board and player to move):
+#   moves: legal moves of the player to move as a bit mask (bit i = action i)
+#   passes: True if the player to move has no legal move (only the no-op action is valid)
+#   ended: getGameEnded(board, player) result
+RulesEntry = namedtuple('RulesEntry', ['moves', 'passes', 'ended'])
+
+
+class TranspositionTable:
+    """
+    Size-bounded LRU map from position keys (Game.getHash) to RulesEntry.
+    Positions reached through different move orders, by different searches or
+    in different games share one entry, so legal moves and terminal status are
+    computed once per position. Least recently used entries are evicted once
+    the memory cap is reached.
+    """
+
+    # Approximate memory held by one entry (dict slot, key and RulesEntry with its ints).
+    ENTRY_BYTES = 256
+
+    def __init__(self, max_bytes=64 * 2 ** 20):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()  # searches of several threads (e.g. sharing an InferenceServer) share a table.
+        self.max_entries = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.resize(max_bytes)
+
+    def resize(self, max_bytes):
+        """ Sets the memory cap (in bytes), evicting entries if the table is already larger. """
+        with self.lock:
+            self.max_entries = max(1, int(max_bytes // self.ENTRY_BYTES))
+            self._evict()
+
+    def _evict(self):
+        """ Drops least recently used entries down to the cap; the caller holds the lock. """
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key):
+        """ Returns the entry of key (marking it as recently used) or None. """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        with self.lock:
+            self.entries.pop(key, None)  # a re-inserted key moves to the most recently used end.
+            self.entries[key] = entry
+            self._evict()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'max_entries': self.max_entries, 'hits': self.hits,
+                    'misses': self.misses, 'evictions': self.evictions, 'hit_rate': self.hit_rate()}
+
+    def __len__(self):
+        return len(self.entries)
+
+
+# Process-wide table shared by every game (and therefore every RHEA and MCTS search) of the process.
+shared_table = TranspositionTable()
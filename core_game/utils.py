@@ -19,4 +19,10 @@ class AverageMeter(object):
 
 class dotdict(dict):
     def __getattr__(self, name):
-        return self[name]
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)  # hasattr, getattr(x, name, default) and copy rely on AttributeError.
+
+    def __setattr__(self, name, value):
+        self[name] = value  # args.x = v must be seen by copies such as dict(args).
@@ -1,5 +1,6 @@
 import logging
 
+import numpy as np
 from tqdm import tqdm
 
 from alpha_zero.MCTS import MCTS
@@ -50,6 +51,7 @@ class Arena:
         else:
             board = players[-curPlayer+1].board                 # Else the other player is RHEA, get its board
 
+        canonical = np.empty_like(board.pieces)  # canonical form given to the other players, rewritten every turn
         it = 0
         while self.game.getGameEnded(board.pieces, curPlayer) == 0:  # Continue until the end of the game
             it += 1
@@ -60,13 +62,16 @@ class Arena:
             if isinstance(players[curPlayer + 1], RHEAPopulation):
                 # action = players[curPlayer + 1].action_plan[0]
                 players[curPlayer + 1].evolve()
+                if verbose:
+                    print('RHEA Search: {generations} generations (+{children} children), {evaluations} evaluations '
+                          'in {seconds:.2f} s'.format(**players[curPlayer + 1].evolve_stats))
                 action = players[curPlayer + 1].select_and_execute_individual()
                 players[curPlayer + 1].sort_population_fitness()
                 self.rhea_action_chosen.append(action)
             else:
                 # Fixed: MCTS uses except block; rest use try block.
                 try:
-                    action = players[curPlayer + 1](board.pieces * curPlayer)
+                    action = players[curPlayer + 1](self.game.getCanonicalForm(board.pieces, curPlayer, out=canonical))
                 except TypeError:
                     action = players[curPlayer+1](board.pieces, curPlayer)
 
@@ -60,14 +60,14 @@ class Coach:
             episodeStep += 1
 
             # self.rhea.debug_print_population()
-            best_indv = self.rhea.evolve()
+            self.rhea.evolve()
 
             action, opp_action = self.rhea.self_play()
 
             action_vector = np.zeros(self.game.getActionSize())
-            action_vector[best_indv.action_plan[0]] = 1
+            action_vector[action] = 1  # the executed move (first action of the best individual)
 
-            sym = self.game.getSymmetries(board.pieces, action_vector)
+            sym = self.game.getSymmetries(np.array(board.pieces), action_vector)  # board is played in place.
             for b, p in sym:
                 trainExamples.append([b, self.curPlayer, p, None])
 
@@ -82,7 +82,7 @@ class Coach:
             # print('*******************')
 
             # reward is received when the game ends:
-            r = self.game.getGameEnded(np.array(self.rhea.board.pieces), self.curPlayer)
+            r = self.game.getGameEnded(self.rhea.board.pieces, self.curPlayer)
             # self.rhea.board = board
 
             # Get board, action and give the reward to the player
@@ -113,6 +113,9 @@ class Coach:
                                                               args=self.args, board=Board(6))
                     iterationTrainExamples += self.execute_episode()
 
+                if getattr(self.nnet, 'cache', None) is not None:
+                    log.info(f'Evaluation cache: {self.nnet.cache.stats()}')
+
                 # save the iteration examples to the history
                 self.trainExamplesHistory.append(iterationTrainExamples)
 
@@ -131,9 +134,8 @@ class Coach:
                 trainExamples.extend(e)
             shuffle(trainExamples)
 
-            # training new network, keeping a copy of the old one
-            self.nnet.save_checkpoint(folder=self.args.checkpoint, filename='temp.pth.tar')
-            self.pnet.load_checkpoint(folder=self.args.checkpoint, filename='temp.pth.tar')
+            # training new network, keeping the old one: pnet shares its weights until training copies them
+            self.pnet.share_weights(self.nnet)
 
             board = Board(6)
             p_rhea = RHEAPopulation.RHEAPopulation(game=self.game, nnet=self.pnet, args=self.args, board=board)
@@ -153,12 +155,15 @@ class Coach:
             log.info('NEW/PREV WINS : %d / %d ; DRAWS : %d' % (n_wins, p_wins, draws))
             if p_wins + n_wins == 0 or float(n_wins) / (p_wins + n_wins) < self.args.updateThreshold:
                 log.info('REJECTING NEW MODEL')
-                self.nnet.load_checkpoint(folder=self.args.checkpoint, filename='temp.pth.tar')
+                self.nnet.share_weights(self.pnet)
             else:
                 log.info('ACCEPTING NEW MODEL')
                 self.nnet.save_checkpoint(folder=self.args.checkpoint, filename=self.get_checkpoint_file(i))
                 self.nnet.save_checkpoint(folder=self.args.checkpoint, filename='best.pth.tar')
 
+            # Write the inference metrics of this iteration (self-play and arena games) in one go.
+            self.nnet.flush_metrics()
+
     @staticmethod
     def get_checkpoint_file(iteration):
         return 'checkpoint_' + str(iteration) + '.pth.tar'
@@ -0,0 +1,122 @@
+import numpy as np
+
+from othello.OthelloLogic import Board
+
+
+class PlanNode:
+    """
+    Position reached from the root of a PlanTrie by a sequence of plies: its board (never modified once
+    created), the player to move and what has been computed on it.
+    """
+
+    __slots__ = ('board', 'player', 'children', 'valid_actions', 'evaluations')
+
+    def __init__(self, board, player):
+        self.board = board
+        self.player = player        # Player to move.
+        self.children = {}          # action -> PlanNode
+        self.valid_actions = {}     # player -> valid action indices
+        self.evaluations = {}       # player -> (pi, v) of the board in player's canonical form
+
+
+class PlanTrie:
+    """
+    Prefix trie of the plans of a RHEAPopulation, keyed on the interleaved (action, opp_action) sequence.
+    Individuals share long prefixes (elites, crossover children copying a parent up to the crossover index,
+    the shift buffer), so evaluating or repairing a plan only simulates the plies after the longest prefix
+    already in the trie and only evaluates positions not evaluated yet. When the game advances, rebase keeps
+    the subtree of the position reached instead of rebuilding the trie.
+    """
+
+    def __init__(self, game, board, player):
+        self.game = game
+        self.root = None
+        self.previous = None  # Root replaced by the last rebase that found no node; still searched by rebase.
+        self.reset(board, player)
+
+    def reset(self, board, player):
+        """ Drops every node; the root becomes (a copy of) board with player to move. """
+        root = Board(board.n)
+        np.copyto(root.pieces, board.pieces)
+        self.root = PlanNode(root, player)
+        self.previous = None
+
+    def rebase(self, board, player, depth=2):
+        """
+        Moves the root to the node, at most depth plies below it, holding board with player to move, keeping
+        its subtree; otherwise starts a new trie there. The root it replaces is searched as well until the next
+        rebase, first: after its own move, RHEA shifts its plans on the board with itself to move (a position not
+        in the trie), and the position reached by the opponent's reply is two plies below the root before the move.
+        :return: True if the trie was rebased (or already rooted there), False if it was reset.
+        """
+        nodes = [self.root] if self.previous is None else [self.previous, self.root]
+        for _ in range(depth + 1):
+            for node in nodes:
+                if node.player == player and np.array_equal(node.board.pieces, board.pieces):
+                    if node is not self.root:
+                        self.root = node
+                        self.previous = None
+                    return True
+            nodes = [child for node in nodes for child in node.children.values()]
+        previous = self.root
+        self.reset(board, player)
+        self.previous = previous
+        return False
+
+    def prune(self, plans):
+        """
+        Drops the nodes off the paths of plans, (action_plan, opp_plan) pairs, except below their ends (where the
+        shift buffer plans its next actions), so the trie keeps the positions the next generation can reuse
+        instead of every position ever simulated for this root.
+        """
+        kept = {}  # id(node) -> (node, actions of the children to keep, or None for all of them)
+        for action_plan, opp_plan in plans:
+            node = self.root
+            for i in range(2 * len(action_plan)):
+                action = action_plan[i // 2] if i % 2 == 0 else opp_plan[i // 2]
+                _, actions = kept.setdefault(id(node), (node, set()))
+                if action not in node.children:
+                    break
+                if actions is not None:
+                    actions.add(action)
+                node = node.children[action]
+            else:
+                kept[id(node)] = (node, None)
+        for node, actions in kept.values():
+            if actions is not None:
+                node.children = {action: child for action, child in node.children.items() if action in actions}
+
+    def child(self, node, action):
+        """ Node reached when the player to move at node plays action (created on first use). """
+        child = node.children.get(action)
+        if child is None:
+            board = Board(node.board.n)
+            np.copyto(board.pieces, node.board.pieces)
+            board.make_move((int(action / board.n), action % board.n), node.player)
+            child = node.children[action] = PlanNode(board, -node.player)
+        return child
+
+    def node(self, action_plan, opp_plan, length):
+        """ Node reached from the root by the first length (action, opp_action) pairs of the plans. """
+        node = self.root
+        for i in range(length):
+            node = self.child(self.child(node, action_plan[i]), opp_plan[i])
+        return node
+
+    def valid_actions(self, node, player):
+        """ Valid action indices of player at node (computed once). """
+        valid = node.valid_actions.get(player)
+        if valid is None:
+            valid = node.valid_actions[player] = np.where(self.game.getValidMoves(node.board.pieces, player) == 1)[0]
+        return valid
+
+    def evaluate(self, node, player):
+        """
+        Evaluation steps (see RHEAIndividual.run_steps) returning the (pi, v) of the board of node in player's
+        canonical form; each node is evaluated once per player.
+        """
+        evaluation = node.evaluations.get(player)
+        if evaluation is None:
+            evaluation = yield self.game.getCanonicalForm(node.board.pieces, player)
+            node.evaluations[player] = evaluation
+        return evaluation
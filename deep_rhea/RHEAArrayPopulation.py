@@ -0,0 +1,192 @@
+import numpy as np
+
+import deep_rhea.RHEAIndividual as RHEAIndividual
+from core_game.EvaluationCache import SEARCH_CACHE_BYTES, SymmetricEvaluator
+from deep_rhea.PlanTrie import PlanTrie
+from deep_rhea.RHEAPopulation import RHEAPopulation
+from othello.OthelloLogic import Board
+
+
+class RHEAArrayPopulation(RHEAPopulation):
+    """
+    RHEA population stored in arrays instead of individual objects: genes is a (P, L, 2) int8 array (the action
+    plan and the opponent plan of each individual) and pop_fitness a (P,) float32 vector, kept sorted by fitness.
+    Selection, crossover and the choice of the mutated genes are done for all children of a generation at once;
+    only the evaluation and the repair of the plans run per individual, on views of their rows. Populations of
+    hundreds of individuals are practical.
+
+    It is a drop-in replacement for RHEAPopulation (evolve, self_play, select_and_execute_individual, Arena);
+    individuals gives RHEAIndividual views of the rows, built on every access, so the methods looping over the
+    population work on the arrays instead.
+    """
+
+    def __init__(self, game, nnet, args, player=1, board=None, fitness_nnet=None):
+        """
+        Same arguments as RHEAPopulation.
+        """
+        self.game = game
+        self.nnet = nnet
+        self.fitness_nnet = nnet if fitness_nnet is None else fitness_nnet
+        self.args = args
+        self.player = player  # Always start with player 1. (design choice)
+
+        # Get the initial board configuration to set up the individuals.
+        if board is None:
+            self.board = Board(6)
+        else:
+            self.board = board
+
+        self.trie = PlanTrie(game, self.board, self.player)
+        self.trie_version = getattr(self.fitness_nnet, 'version', None)
+        self.evaluator = SymmetricEvaluator.of(game, self.fitness_nnet,
+                                               args.get('EVAL_CACHE_BYTES', SEARCH_CACHE_BYTES))
+        self.canonical_board = np.empty_like(self.board.pieces)  # getCanonicalForm output of execution_order
+        self.reset_budget()
+        self.evolve_stats = None
+
+        # Build the plans of the individuals (in lockstep) and store them in the arrays:
+        individuals = [self.individual() for _ in range(self.args.NUM_OF_INDIVIDUALS)]
+        self.evaluate(individuals)
+        self.genes = np.empty((len(individuals), self.args.INDIVIDUAL_LENGTH, 2), dtype=np.int8)
+        self.genes[:, :, 0] = [indv.action_plan for indv in individuals]
+        self.genes[:, :, 1] = [indv.opp_plan for indv in individuals]
+        self.pop_fitness = self.fitness_of(individuals)
+
+        # Sort the population with respect to their fitness: (descending order)
+        self.sort_population_fitness()
+
+    def individual(self, index=None, length=None):
+        """
+        :return: RHEAIndividual whose plans are views of the first length genes of the individual at index (all of
+        them by default), so evaluation steps and mutations write to the arrays; a new, unplanned individual if
+        index is None.
+        """
+        if index is None:
+            return RHEAIndividual.RHEAIndividual(game=self.game, args=self.args, nnet=self.fitness_nnet,
+                                                 board=self.board, player=self.player, evaluate=False,
+                                                 trie=self.trie)
+        indv = RHEAIndividual.RHEAIndividual(game=self.game, args=self.args, nnet=self.fitness_nnet,
+                                             board=self.board, action_plan=self.genes[index, :length, 0],
+                                             opp_plan=self.genes[index, :length, 1], player=self.player,
+                                             evaluate=False, trie=self.trie)
+        indv.fitness = self.pop_fitness[index:index + 1]
+        return indv
+
+    @property
+    def individuals(self):
+        """ RHEAIndividual views of the individuals, in fitness order (a new list of P views per access). """
+        return [self.individual(i) for i in range(len(self.genes))]
+
+    @staticmethod
+    def fitness_of(individuals):
+        """ :return: float32 vector of the fitness of individuals (measured by their evaluation steps). """
+        return np.array([np.ravel(indv.fitness)[0] for indv in individuals], dtype=np.float32)
+
+    def sort_population_fitness(self):
+        """
+        Sorts the population by their fitness in descending order (ties keep their order).
+        """
+        order = np.argsort(-self.pop_fitness, kind='stable')
+        self.genes = self.genes[order]
+        self.pop_fitness = self.pop_fitness[order]
+
+    def shift_plans(self):
+        """
+        Shift buffer, once the game advanced: shifts the genes of every individual one action pair to the left and
+        plans the last pair, re-measuring the fitness.
+        """
+        self.genes[:, :-1] = self.genes[:, 1:]
+        individuals = [self.individual(i, length=-1) for i in range(len(self.genes))]
+        self.genes[:, -1] = self.evaluate(individuals)
+        self.pop_fitness = self.fitness_of(individuals)
+
+    def evolve_generation(self):
+        """
+        Assumes sorted individuals. Evolves the population for 1 generation: keeps the elites, and makes the other
+        individuals by rank selection, crossover and mutation of the current population. If the budget of evolve
+        runs out while the children are evaluated, only the children evaluated so far enter the population, in
+        place of its worst individuals.
+        :return: the number of children that entered the population (all of them if the generation was completed).
+        """
+        genes, fitness = self.genes, self.pop_fitness
+        size, length, _ = genes.shape
+        elites = self.args.NUM_OF_BEST_INDIVIDUALS
+        remaining_indv = size - elites
+
+        # Rank selection among the non-elite individuals (as RHEAPopulation): the i-th best of them is picked with
+        # probability (remaining_indv - i) / total_fitness.
+        ranks = np.arange(remaining_indv, 0, -1)
+        cumulative_probabilities = np.cumsum(ranks / ranks.sum())
+        parents = np.searchsorted(cumulative_probabilities, np.random.random((remaining_indv, 2)), side='right')
+        parents = elites + np.minimum(parents, remaining_indv - 1)  # guards the rounding of the last probability.
+
+        # Crossover: genes up to (and including) the crossover index come from the first parent, the rest from the
+        # second one.
+        crossover_idx = np.random.randint(1, length, size=remaining_indv)
+        from_first = np.arange(length) <= crossover_idx[:, np.newaxis]
+        children = np.where(from_first[:, :, np.newaxis], genes[parents[:, 0]], genes[parents[:, 1]])
+
+        # Genes to mutate, CROSSOVER_MUTATIONS per child (start from first, end at last index):
+        mutations = np.random.randint(1, length, size=(remaining_indv, self.args.CROSSOVER_MUTATIONS))
+
+        self.genes = np.concatenate([genes[:elites], children])
+        individuals = [self.individual(i) for i in range(elites, size)]
+
+        # Fitness of all children in lockstep; it is measured before the mutations, as always.
+        evaluated = np.array([result is not None for result in self.evaluate(individuals, budgeted=True)],
+                             dtype=bool)
+        self.pop_fitness = np.concatenate([fitness[:elites], self.fitness_of(individuals)])
+        for indv, indices, done in zip(individuals, mutations, evaluated):
+            if done:  # children abandoned by the budget are replaced below.
+                for idx in indices:
+                    indv.mutate_genes(idx)
+
+        # Out of budget: the best individuals of the current generation take the places of the missing children.
+        missing = elites + np.flatnonzero(~evaluated)
+        self.genes[missing] = genes[elites:elites + len(missing)]
+        self.pop_fitness[missing] = fitness[elites:elites + len(missing)]
+
+        self.trie.prune([(self.genes[i, :, 0], self.genes[i, :, 1]) for i in range(size)])
+
+        # Sort the new population as well:
+        self.sort_population_fitness()
+        return int(evaluated.sum())
+
+    def execution_order(self):
+        """
+        Indices of the individuals in the order their first action is tried for execution (see
+        RHEAPopulation.execution_order), from the first genes of the arrays.
+        """
+        if self.fitness_nnet is self.nnet:
+            return list(range(len(self.genes)))
+        pi, _ = self.nnet.predict(self.game.getCanonicalForm(self.board.pieces, self.player, out=self.canonical_board))
+        return list(np.argsort(-pi[self.genes[:, 0, 0]], kind='stable'))
+
+    def select_and_execute_individual(self):
+        """
+        Plays the first action of the first individual of execution_order whose first action is valid and shifts
+        the plans. If there is none, the last individual tried moves to the end of the population (as in
+        RHEAPopulation) and a random valid action is played.
+        :return: the action played.
+        """
+        valid = self.game.getValidMoves(self.board.pieces, self.player)
+        order = self.execution_order()
+        for idx in order:
+            player_action = self.genes[idx, 0, 0]
+            if valid[player_action]:
+                RHEAIndividual.RHEAIndividual.play_ply(self.game, self.board, self.player, player_action)
+                self.shift_plans()
+                return player_action
+
+        rows = np.append(np.delete(np.arange(len(self.genes)), order[-1]), order[-1])
+        self.genes = self.genes[rows]
+        self.pop_fitness = self.pop_fitness[rows]
+        player_action = np.random.permutation(np.where(valid == 1)[0])[0]
+        RHEAIndividual.RHEAIndividual.play_ply(self.game, self.board, self.player, player_action)
+        return player_action
+
+    def get_indv_fitness(self):
+        return self.pop_fitness
+
+    def set_board(self, pieces):
+        self.board = pieces
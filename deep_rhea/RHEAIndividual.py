@@ -1,15 +1,66 @@
 import random
 import numpy as np
 
-from copy import deepcopy
 from core_game.Game import Game
+from deep_rhea.PlanTrie import PlanTrie
 
 
 #  Same action plans may lead to different board configs due to opponent behavior. Different boards correspond to
 #  different fitness; which is not distinguishable by the individual only by using action plan.
 #  Maybe it is best to double the plan size; including opponent. Play two ply and re-order individuals so that opponent
 #  models are kept valid.
-from othello.OthelloLogic import Board
+
+
+def run_steps(steps, nnet):
+    """
+    Runs the evaluation steps of one individual: steps is a generator that yields the canonical boards it needs
+    evaluated and receives their (pi, v); each board is evaluated with nnet.predict.
+    :return: the return value of steps.
+    """
+    try:
+        board = next(steps)
+        while True:
+            board = steps.send(nnet.predict(board))
+    except StopIteration as stop:
+        return stop.value
+
+
+def run_lockstep(steps, nnet, interrupt=None):
+    """
+    Runs the evaluation steps of several individuals together (see run_steps): their simulated games advance one
+    ply at a time and the boards all of them yield in a round are evaluated with one nnet.predict_batch (a board
+    yielded by several steps is evaluated once).
+    The steps must not modify the boards they yield.
+    interrupt, if given, is called with the number of boards of each round before evaluating them; when it returns
+    True, the steps still running are abandoned (e.g. a time budget ran out).
+    :return: the list of the return values of steps (None for the abandoned ones).
+    """
+    results = [None] * len(steps)
+    pending = {}  # index of the steps -> board it waits for
+    for i in range(len(steps)):
+        try:
+            pending[i] = next(steps[i])
+        except StopIteration as stop:
+            results[i] = stop.value
+
+    while pending:
+        waiting = list(pending)
+        rows = {}  # board bytes -> row of the batch
+        for i in waiting:
+            rows.setdefault(pending[i].tobytes(), (len(rows), pending[i]))
+        if interrupt is not None and interrupt(len(rows)):
+            for i in waiting:
+                steps[i].close()
+            break
+        pis, vs = nnet.predict_batch(np.stack([board for _, board in rows.values()]))
+        waiting = [(i, rows[pending[i].tobytes()][0]) for i in waiting]
+        pending = {}
+        for i, k in waiting:
+            try:
+                pending[i] = steps[i].send((pis[k], vs[k:k + 1]))
+            except StopIteration as stop:
+                results[i] = stop.value
+    return results
 
 
 class RHEAIndividual:
@@ -18,7 +69,14 @@ class RHEAIndividual:
     to RHEAPopulation.
     """
 
-    def __init__(self, game: Game, args, nnet, board=None, action_plan=None, opp_plan=None, player=1):
+    def __init__(self, game: Game, args, nnet, board=None, action_plan=None, opp_plan=None, player=1,
+                 evaluate=True, trie=None):
+        """
+        evaluate=False leaves building the plan or measuring the fitness to the caller, which runs
+        evaluation_steps, e.g. in lockstep with other individuals (RHEAPopulation.evaluate).
+        trie is the PlanTrie (rooted at board, player to move) the plans are simulated in, shared by the
+        individuals of a population; by default the individual has one of its own.
+        """
         self.args = args
 
         self.fitness = 0                # Fitness of the individual.
@@ -27,39 +85,55 @@ class RHEAIndividual:
 
         self.game = game                # Game information relayed to individual.
         self.player = player            # Player 1 is +1, player 2 is -1.
-        self.board = deepcopy(board)    # Board state controlled by RHEAPopulation.
+        self.board = board              # Root position, shared with RHEAPopulation (never copied).
         self.nnet = nnet      # Neural Network, used to fetch policy/value.
 
+        # Positions along the plans, with their valid moves and evaluations (computed once per position).
+        self.trie = PlanTrie(game, board, player) if trie is None else trie
+
         # If individual is created from scratch, fitness is also calculated. Otherwise calculate individual's fitness.
+        if evaluate:
+            run_steps(self.evaluation_steps(), nnet)
+
+    def evaluation_steps(self):
+        """
+        Evaluation steps (see run_steps) of a new individual: builds the plan of an individual created from
+        scratch, otherwise measures its fitness.
+        :return: None for a new plan, otherwise the next action pair for the shift buffer (measure_fitness).
+        """
         if self.action_plan is None or self.opp_plan is None:
-            self.action_plan, self.opp_plan, self.fitness = self.build_plan()
-        else:
-            _ = self.measure_fitness()  # next action is not useful here; learning the fitness is sufficient.
+            self.action_plan, self.opp_plan, self.fitness = yield from self.build_plan_steps()
+            return None
+        return (yield from self.measure_fitness_steps())
 
     def build_plan(self):
         """
-            Construct's individual's action plan from scratch. Plays the plan (and opponent plan) on a copy of the
-            board configuration to build the action plan for the game.
+            Construct's individual's action plan from scratch. Plays the plan (and opponent plan) down the
+            trie from its root, to build the action plan for the game.
             @:return A valid action plan for this game.
         """
+        return run_steps(self.build_plan_steps(), self.nnet)
 
-        temp_gamestate = deepcopy(self.game)
-        temp_board = deepcopy(self.board)
+    def build_plan_steps(self):
+        """
+        Evaluation steps of build_plan.
+        """
         fitness = self.fitness
         draft_plan = []
         opp_plan = []
+        node = self.trie.root
 
         # For each action that is to be filled in the action plan do the following:
         for i in range(self.args.INDIVIDUAL_LENGTH):
 
             # If game ended put -1 to the sequence: (getGameEnded outputs +1:won, -1:lose, 0:not finished)
-            if temp_gamestate.getGameEnded(temp_board.pieces, self.player) != 0:
+            if self.game.getGameEnded(node.board.pieces, self.player) != 0:
                 draft_plan.append(36)
                 opp_plan.append(36)
-                _, fitness = self.nnet.predict(np.array(temp_board.pieces) * self.player)
+                node = self.trie.child(self.trie.child(node, 36), 36)
             else:
                 # If game not ended: Get the best performing action from the neural network and apply it to the network:
-                action, temp_gamestate, temp_board, _ = self.plan_base_action(temp_gamestate, temp_board, self.player)
+                action, node, _ = yield from self.plan_node_steps(node)
 
                 # Append planned action to the sequence.
                 draft_plan.append(action)
@@ -67,49 +141,59 @@ class RHEAIndividual:
                 # Play the Neural Network based optimal action for the opponent as well:
                 # No need to append this to the Neural network. This is to ensure validity of the action taken.
                 # Even no-op (36) is played; it is still a move. Opponent does not explore in this case (mutate=False).
-                opp_act, temp_gamestate, temp_board, _ = self.plan_base_action(temp_gamestate, temp_board,
-                                                                               -self.player, mutate=False)
+                opp_act, node, _ = yield from self.plan_node_steps(node, mutate=False)
                 opp_plan.append(opp_act)
 
             # Determine the fitness for the player for this board configuration.
-            _, fitness = self.nnet.predict(np.array(temp_board.pieces) * self.player)
+            _, fitness = yield from self.trie.evaluate(node, self.player)
 
         # Final move played by the opponent; which gives the fitness of the board state (current state) after opponent.
         return draft_plan, opp_plan, fitness
 
-    def plan_base_action(self, game, board, player, mutate=True):
+    def plan_node_steps(self, node, mutate=True):
         """
-        Plans 1 action that is to be taken by the agent using the neural network provided.
-        :return: action, game and board states after playing a hypothetical turn.
+        Evaluation steps planning 1 action for the player to move at the trie node, using the neural network.
+        :return: action, the node it leads to (hypothetical turn) and the fitness of the best action.
         """
-        # Plan a valid action:
-        action, valid_action_indices, fitness = self.plan_valid_ply(game, board, player)
+        player = node.player
+        valid_action_indices = self.trie.valid_actions(node, player)
+
+        # If game not ended: Get the best performing action from the neural network:
+        action, _ = yield from self.trie.evaluate(node, player)
+        action = np.argmax(action)
+
+        if action not in valid_action_indices:  # This is for safety; do not allow invalid actions in training.
+            #  Randomize the valid indices (the trie's array stays as is) and get the first valid action.
+            action = np.random.permutation(valid_action_indices)[0]
+
+        # Hypothetically play the action and then get the fitness of the changed board state configuration:
+        child = self.trie.child(node, action)
+        _, fitness = yield from self.trie.evaluate(child, player)
 
         # For each gene, there is a chance that it mutates into a random valid gene:
         if mutate:
             if random.uniform(0, 1) >= self.args.MUTATION_CHANCE:
-                #  Returns all possible valid indices, then randomize and get the first action on list of valid actions.
-                np.random.shuffle(valid_action_indices)
-                action = valid_action_indices[0]
-
-        # Play the action (ply-half turn) for this player: (Used with temp board, game) - To progress construction.
-        self.play_ply(game, board, player, action)
+                action = np.random.permutation(valid_action_indices)[0]
+                child = self.trie.child(node, action)
 
-        # Append planned action to the sequence.
-        return action, game, board, fitness
+        return action, child, fitness
 
-    def plan_valid_ply(self, game, board, player):
+    def plan_valid_ply(self, game, board, player, nnet=None):
         """
         Plans a valid half-turn given the board config player id and game rules.
+        nnet overrides the individual's network (e.g. the teacher for executed moves).
         """
+        return run_steps(self.plan_valid_ply_steps(game, board, player), self.nnet if nnet is None else nnet)
 
-        temp_game = deepcopy(game)
-
+    def plan_valid_ply_steps(self, game, board, player):
+        """
+        Evaluation steps of plan_valid_ply.
+        """
         # Get valid indices:
-        valid_action_indices = np.where(game.getValidMoves(np.array(board.pieces), player) == 1)[0]
+        valid_action_indices = np.where(game.getValidMoves(board.pieces, player) == 1)[0]
 
         # If game not ended: Get the best performing action from the neural network:
-        action, _ = self.nnet.predict(np.array(board.pieces) * player)  # board*player is canonical form of board.
+        action, _ = yield game.getCanonicalForm(board.pieces, player)
         action = np.argmax(action)
 
         if action not in valid_action_indices:  # This is for safety; do not allow invalid actions in training.
@@ -118,49 +202,44 @@ class RHEAIndividual:
             action = valid_action_indices[0]
 
         # Hypothetically play the action and then get the fitness of the changed board state configuration:
-        temp_board = temp_game.getNextState(np.array(board.pieces), player, action)[0]
-        _, fitness = self.nnet.predict(np.array(temp_board) * player)  # board*player is canonical form of board.
+        undo = self.play_ply(game, board, player, action)
+        _, fitness = yield game.getCanonicalForm(board.pieces, player)
+        board.unmake_move(undo)
 
         return action, valid_action_indices, fitness
 
     @staticmethod
     def play_ply(game, board, player, action):
         """
-        Executes the action in given game board.
+        Executes the action in given game board (in place).
+        :return: undo record of the move, for board.unmake_move.
         """
         # Play this turn to for the player:
-        board.pieces = game.getNextState(np.array(board.pieces), player, action)[0]
         move = (int(action / board.n), action % board.n)
-        board.execute_move(move, player)
+        return board.make_move(move, player)
 
     def measure_fitness(self):
         """
         Measures fitness for the player and also plans for the next states.
         :return:
         """
-        temp_game = deepcopy(self.game)
-        temp_board = deepcopy(self.board)
+        return run_steps(self.measure_fitness_steps(), self.nnet)
 
+    def measure_fitness_steps(self):
+        """
+        Evaluation steps of measure_fitness. Only the plies after the longest prefix of the plans already in
+        the trie are simulated.
+        """
         # Simulate the game throughout the horizon:
-        for i in range(len(self.action_plan)):
-            action = self.action_plan[i]
-            opp_action = self.opp_plan[i]
-
-            # Play this ply to for the player:
-            self.play_ply(temp_game, temp_board, self.player, action)
-
-            # Play ply of opponent:
-            self.play_ply(temp_game, temp_board, -self.player, opp_action)
+        node = self.trie.node(self.action_plan, self.opp_plan, len(self.action_plan))
 
         # From Neural Network get a new action fo the shift buffer (more trained --> less random)
-        next_action, _, _, _ = self.plan_base_action(temp_game, temp_board, self.player)
-        self.play_ply(temp_game, temp_board, self.player, next_action)
+        next_action, node, _ = yield from self.plan_node_steps(node)
 
         # Get a new opponent action
-        next_opponent_action, _, _, _ = self.plan_base_action(temp_game, temp_board, -self.player)
-        self.play_ply(temp_game, temp_board, -self.player, next_opponent_action)
+        next_opponent_action, node, _ = yield from self.plan_node_steps(node)
 
-        _, self.fitness = self.nnet.predict(np.array(temp_board.pieces) * self.player)
+        _, self.fitness = yield from self.trie.evaluate(node, self.player)
 
         return next_action, next_opponent_action  # for appending the next action for the shift buffer.
 
@@ -196,53 +275,44 @@ class RHEAIndividual:
         """
         Mutate the gene at the given index and adjust the remaining sequence as close to the original sequence.
         Mutations return valid action sets, given the current board configuration.
+        The plans are replayed down the trie, so the shared prefix up to index is not simulated again.
         """
-        temp_board = Board(6)
-
         # Play the hypothetical game until index is reached:
-        for i in range(index):
-            self.play_ply(self.game, temp_board, self.player, self.action_plan[i])
-            self.play_ply(self.game, temp_board, -self.player, self.opp_plan[i])
+        node = self.trie.node(self.action_plan, self.opp_plan, index)
 
         # Mutate the action plan for the RHEA player with a random valid action:
-        valid_action_indices = np.where(self.game.getValidMoves(np.array(temp_board.pieces), self.player) == 1)[0]
-        np.random.shuffle(valid_action_indices)
-        action = valid_action_indices[0]
+        action = np.random.permutation(self.trie.valid_actions(node, self.player))[0]
 
         # Reflect the changes and play this:
         self.action_plan[index] = action
-        self.play_ply(self.game, temp_board, self.player, action)
+        node = self.trie.child(node, action)
 
         # Check opponent action validity mutate it as well if it becomes invalid:
-        valid_action_indices = np.where(self.game.getValidMoves(np.array(temp_board.pieces), -self.player) == 1)[0]
+        valid_action_indices = self.trie.valid_actions(node, -self.player)
         if self.opp_plan[index] not in valid_action_indices:
-            #  Returns all possible valid indices, then randomize and get the first action on list of valid actions.
-            np.random.shuffle(valid_action_indices)
-            opp_action = valid_action_indices[0]
-            self.opp_plan[index] = opp_action
+            #  Randomize the valid indices and get the first action on list of valid actions.
+            self.opp_plan[index] = np.random.permutation(valid_action_indices)[0]
 
-        self.play_ply(self.game, temp_board, -self.player, self.opp_plan[index])
+        node = self.trie.child(node, self.opp_plan[index])
 
         # Repair procedure: (Check the rest)
         for j in range(index+1, len(self.action_plan)):
             # First RHEA Player:
             self.action_plan[j] = action
-            valid_actions = np.where(self.game.getValidMoves(np.array(temp_board.pieces), self.player) == 1)[0]
+            valid_actions = self.trie.valid_actions(node, self.player)
 
             if action not in valid_actions:
-                #  Returns all possible valid indices, then randomize and get the first action on list of valid actions.
-                np.random.shuffle(valid_actions)
-                self.action_plan[j] = valid_actions[0]
+                #  Randomize the valid indices and get the first action on list of valid actions.
+                self.action_plan[j] = np.random.permutation(valid_actions)[0]
 
-            self.play_ply(self.game, temp_board, self.player, action)
+            node = self.trie.child(node, action)
 
             # Now, opponent player:
             self.opp_plan[j] = action
-            valid_actions = np.where(self.game.getValidMoves(np.array(temp_board.pieces), -self.player) == 1)[0]
+            valid_actions = self.trie.valid_actions(node, -self.player)
 
             if action not in valid_actions:
-                #  Returns all possible valid indices, then randomize and get the first action on list of valid actions.
-                np.random.shuffle(valid_actions)
-                self.opp_plan[j] = valid_actions[0]
+                #  Randomize the valid indices and get the first action on list of valid actions.
+                self.opp_plan[j] = np.random.permutation(valid_actions)[0]
 
-            self.play_ply(self.game, temp_board, -self.player, action)
+            node = self.trie.child(node, action)
@@ -1,6 +1,10 @@
 import random
+import time
 import numpy as np
 import deep_rhea.RHEAIndividual as RHEAIndividual
+from core_game.EvaluationCache import SEARCH_CACHE_BYTES, SymmetricEvaluator
+from core_game.utils import dotdict
+from deep_rhea.PlanTrie import PlanTrie
 from othello.OthelloLogic import Board
 
 
@@ -11,18 +15,21 @@ class RHEAPopulation:
     generations to current generations.
     """
 
-    def __init__(self, game, nnet, args, player=1, board=None):
+    def __init__(self, game, nnet, args, player=1, board=None, fitness_nnet=None):
         """
         Initializes the RHE Search with a population of N;
         evolves the best individual and passes it to the rest of the
         code.
 
         :param game:
-        :param nnet:
+        :param nnet: network picking the executed moves.
         :param args:
+        :param fitness_nnet: network the individuals plan and measure fitness with, e.g. a small distilled
+                             student of nnet (NNetWrapper.distill). Defaults to nnet.
         """
         self.game = game
         self.nnet = nnet
+        self.fitness_nnet = nnet if fitness_nnet is None else fitness_nnet
         # {num_of_individuals, individual_length, num_of_best_individuals, mutation_chance, max_generation_budget}
         self.args = args
         self.player = player  # Always start with player 1. (design choice)
@@ -33,17 +40,106 @@ class RHEAPopulation:
         else:
             self.board = board
 
-        # Construct the list of individuals and their fitness:
-        self.individuals = []
-        self.pop_fitness = []
-        for i in range(self.args.NUM_OF_INDIVIDUALS):
-            indv = RHEAIndividual.RHEAIndividual(game=game, args=args, nnet=nnet, board=board, player=self.player)
-            self.pop_fitness.append(indv.get_fitness())
-            self.individuals.append(indv)
+        # Trie of the positions along the plans of the individuals, rooted at the current board; individuals
+        # simulate in it and only refer to self.board. Its evaluations are valid for one version of fitness_nnet.
+        self.trie = PlanTrie(game, self.board, self.player)
+        self.trie_version = getattr(self.fitness_nnet, 'version', None)
+        # fitness_nnet through a symmetry cache (args.EVAL_CACHE_BYTES), so symmetric positions are evaluated once.
+        self.evaluator = SymmetricEvaluator.of(game, self.fitness_nnet,
+                                               args.get('EVAL_CACHE_BYTES', SEARCH_CACHE_BYTES))
+        self.canonical_board = np.empty_like(self.board.pieces)  # getCanonicalForm output of execution_order
+        self.reset_budget()
+        self.evolve_stats = None  # generations, evaluations and seconds of the last evolve.
+
+        # Construct the list of individuals and their fitness (plans built in lockstep):
+        self.individuals = [RHEAIndividual.RHEAIndividual(game=game, args=args, nnet=self.fitness_nnet,
+                                                          board=self.board, player=self.player, evaluate=False,
+                                                          trie=self.trie)
+                            for _ in range(self.args.NUM_OF_INDIVIDUALS)]
+        self.evaluate(self.individuals)
+        self.pop_fitness = [indv.get_fitness() for indv in self.individuals]
 
         # Sort the population with respect to their fitness: (descending order)
         self.sort_population_fitness()
 
+    def evaluate(self, individuals, budgeted=False):
+        """
+        Runs the evaluation steps of individuals (RHEAIndividual.evaluation_steps: new plans or fitness) in
+        lockstep in the trie: their simulated games advance one ply at a time and every position of a round not
+        evaluated yet is evaluated with one batched forward pass of fitness_nnet, instead of one predict per
+        board and individual. The evaluated positions are counted in self.evaluations.
+        :param budgeted: abandon the evaluations still running once the budget of evolve runs out.
+        :return: the results of the evaluation steps, e.g. the next actions of the shift buffer (None for the
+        abandoned individuals).
+        """
+        def interrupt(boards):
+            if budgeted and self.budget_exhausted(boards):
+                return True
+            self.evaluations += boards
+            return False
+
+        self.sync_trie()
+        return RHEAIndividual.run_lockstep([indv.evaluation_steps() for indv in individuals], self.evaluator,
+                                           interrupt)
+
+    def reset_budget(self, time_budget=None, evaluation_budget=None):
+        """
+        Starts a budget of time_budget seconds from now and evaluation_budget positions evaluated (either None
+        for no limit) and resets self.evaluations.
+        """
+        self.deadline = None if time_budget is None else time.perf_counter() + time_budget
+        self.evaluation_budget = evaluation_budget
+        self.evaluations = 0
+
+    def budget_exhausted(self, boards=0):
+        """
+        :return: True if the time budget has run out or evaluating boards more positions would exceed the
+        evaluation budget.
+        """
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            return True
+        return self.evaluation_budget is not None and self.evaluations + boards > self.evaluation_budget
+
+    def sync_trie(self):
+        """
+        Roots the trie at the current board and player: rebases it onto the subtree of the position reached when
+        the game advanced a ply or two (or the board was set), otherwise rebuilds it. Drops every evaluation
+        when fitness_nnet has changed (e.g. trained) since they were made.
+        """
+        version = getattr(self.fitness_nnet, 'version', None)
+        if version != self.trie_version:
+            self.trie_version = version
+            self.trie.reset(self.board, self.player)
+            if self.evaluator is not self.fitness_nnet:
+                self.evaluator.cache.clear()
+        else:
+            self.trie.rebase(self.board, self.player)
+
+    def shift_plans(self):
+        """
+        Shift buffer, once the game advanced: pops the first action pair of every plan and appends the next one.
+        """
+        [self.individuals[i].action_plan.pop(0) for i in range(len(self.individuals))]
+        [self.individuals[i].opp_plan.pop(0) for i in range(len(self.individuals))]
+
+        # Update individual's game and boards as well.
+        # Check if new board configs create validity problems in remaining; remove and replace invalid individuals.
+        for i in range(len(self.individuals)):
+            self.individuals[i].game = self.game
+            self.individuals[i].board = self.board
+
+        # Append a valid (Neural network output) final action to the individuals, completing the shift buffer.
+        self.append_next_actions()
+
+    def append_next_actions(self):
+        """
+        Shift buffer: re-measures every individual on the current board and appends the next action pair
+        (planned by the network) to its plans.
+        """
+        for indv, (next_action, next_opp_action) in zip(self.individuals, self.evaluate(self.individuals)):
+            indv.action_plan.append(next_action)
+            indv.opp_plan.append(next_opp_action)
+
     def sort_population_fitness(self):
         """
         Sorts the population by their fitness in descending order. Do not change the fitness values
@@ -62,7 +158,8 @@ class RHEAPopulation:
     def crossover_parents(self, cum_probs):
         """
         Creates an action plan using crossover of two individuals from its generation.
-        :return: Returns an individual for the next generation.
+        :return: Returns an individual for the next generation, to be evaluated (evaluate) and then mutated
+        (mutate_child).
         """
         # Select 2 parents: (Using rank)
         select1 = random.random()
@@ -87,25 +184,27 @@ class RHEAPopulation:
                           else parent2.get_opponent_gene()[i]
                           for i in range(self.args.INDIVIDUAL_LENGTH)]
 
-        # Create and Return child individual along with its fitness:
-        indv = RHEAIndividual.RHEAIndividual(game=self.game, args=self.args, nnet=self.nnet,
+        # Create and Return child individual:
+        return RHEAIndividual.RHEAIndividual(game=self.game, args=self.args, nnet=self.fitness_nnet,
                                              board=self.board, action_plan=draft_plan, opp_plan=draft_opp_plan,
-                                             player=self.player)
+                                             player=self.player, evaluate=False, trie=self.trie)
 
-        # Mutate and repair the genes of the new individual.
+    def mutate_child(self, indv):
+        """
+        Mutates and repairs the genes of a new individual made by crossover_parents, replaying its plans in the
+        trie.
+        """
         for i in range(self.args.CROSSOVER_MUTATIONS):
             idx = random.randint(1, self.args.INDIVIDUAL_LENGTH - 1)
             indv.mutate_genes(idx)
 
-        fitness = indv.get_fitness()
-        fitness_indv = [fitness, indv]
-        return fitness_indv
-
     def evolve_generation(self):
         """
         Assumes sorted individuals. Evolves the population for 1 generation.
-        :return: Mutates the individuals and their fitness values after doing crossover and mutations on the current
-        population.
+        Mutates the individuals and their fitness values after doing crossover and mutations on the current
+        population. If the budget of evolve runs out while the children are evaluated, only the children evaluated
+        so far enter the population, in place of its worst individuals.
+        :return: the number of children that entered the population (all of them if the generation was completed).
         """
         # Pick first elite individuals (NUM_OF_BEST_INDIVIDUALS) that will ascend to the next generation.
         elites = self.individuals[:self.args.NUM_OF_BEST_INDIVIDUALS]
@@ -144,25 +243,48 @@ class RHEAPopulation:
         [new_population.append(elite) for elite in elites]
         [new_fitness.append(fitness) for fitness in elites_fitness]
 
-        for _ in range(len(self.individuals)):
-            fitness_indv = self.crossover_parents(cumulative_probabilities)
-            new_population.append(fitness_indv[1])
-            new_fitness.append(fitness_indv[0])
+        children = [self.crossover_parents(cumulative_probabilities) for _ in range(len(self.individuals))]
+        # Fitness of all children in lockstep; it is measured before the mutations, as always.
+        evaluated = [child for child, result in zip(children, self.evaluate(children, budgeted=True))
+                     if result is not None]
+        for child in evaluated:
+            self.mutate_child(child)
+            new_population.append(child)
+            new_fitness.append(child.get_fitness())
+
+        # Out of budget: the best individuals of the current generation take the places of the missing children.
+        for indv in self.individuals[:len(children) - len(evaluated)]:
+            new_population.append(indv)
+            new_fitness.append(indv.get_fitness())
 
         # Evolve the population while computational budget is not reached (different method -- search)
         self.individuals = new_population
         self.pop_fitness = new_fitness
+        self.trie.prune([(indv.action_plan, indv.opp_plan) for indv in self.individuals])
 
         # Sort the new population as well:
         self.sort_population_fitness()
+        return len(evaluated)
 
-    def evolve(self):
+    def evolve(self, time_budget=None, evaluation_budget=None):
         """
         To be used by RHEA population to plan the best sequences to play.
-        :return:
+        Evolves up to MAX_GENERATION_BUDGET generations. It is an anytime search: given a budget of time_budget
+        seconds or evaluation_budget positions evaluated by fitness_nnet (by default args.TIME_BUDGET and
+        args.EVALUATION_BUDGET, if set), it stops between generations, or between children, when the budget runs
+        out. What was done is reported in self.evolve_stats: generations completed, children of the interrupted
+        generation that entered the population (0 if none), evaluations and seconds.
+        :return: the best individual.
         """
+        start = time.perf_counter()
+        self.reset_budget(self.args.get('TIME_BUDGET') if time_budget is None else time_budget,
+                          self.args.get('EVALUATION_BUDGET') if evaluation_budget is None else evaluation_budget)
+        generations = children = 0
+
         # Until computational budget is reached, do the following:
         for j in range(self.args.MAX_GENERATION_BUDGET):
+            if self.budget_exhausted():
+                break
             # if (j+1) % 10 == 0:
             #     print('Generation ', j + 1, ' computed.')
             # for i in range(len(self.individuals)):
@@ -170,12 +292,32 @@ class RHEAPopulation:
             #           self.individuals[i].get_fitness())
             # print('')
             # Evolve the generation for 1 step.
-            self.evolve_generation()
+            children = self.evolve_generation()
             # self.debug_print_population()
             self.sort_population_fitness()
+            if children < self.args.NUM_OF_INDIVIDUALS - self.args.NUM_OF_BEST_INDIVIDUALS:
+                break
+            generations += 1
+            children = 0
+
+        self.evolve_stats = dotdict({'generations': generations, 'children': children,
+                                     'evaluations': self.evaluations, 'seconds': time.perf_counter() - start})
+        self.reset_budget()  # the budget only applies to this search.
         # action = self.select_and_execute_individual()
         return self.individuals[0]
 
+    def execution_order(self):
+        """
+        Indices of the individuals in the order their first action is tried for execution: fitness order or,
+        when fitness comes from a separate (student) network, ranked by nnet's policy for the first action
+        (ties keep the fitness order), so the teacher picks the executed move among the evolved candidates.
+        """
+        order = list(range(len(self.individuals)))
+        if self.fitness_nnet is self.nnet:
+            return order
+        pi, _ = self.nnet.predict(self.game.getCanonicalForm(self.board.pieces, self.player, out=self.canonical_board))
+        return sorted(order, key=lambda idx: -pi[self.individuals[idx].action_plan[0]])
+
     def select_and_execute_individual(self):
         # This is used for testing the population evolution process on RHEAPopulationTest.py.
         # Might incorporate co-evolution -- Store opponent's action plan as well and evolve both.
@@ -186,9 +328,9 @@ class RHEAPopulation:
         # Note: (Neural Network's dual usage (for both players) mimic co-evolution.)
 
         # Get valid indices:
-        valid_action_indices = np.where(self.game.getValidMoves(np.array(self.board.pieces), self.player) == 1)[0]
+        valid_action_indices = np.where(self.game.getValidMoves(self.board.pieces, self.player) == 1)[0]
 
-        for idx in range(len(self.individuals)):
+        for idx in self.execution_order():
             # Select best individual, get its first action:
             indv = self.individuals[idx]
             player_action = indv.action_plan[0]
@@ -197,18 +339,7 @@ class RHEAPopulation:
                 # Play this action in the game:
                 indv.play_ply(self.game, self.board, self.player, player_action)
                 # Pop all initial actions of all individuals, append a neural network based output at the end
-                [self.individuals[i].action_plan.pop(0) for i in range(len(self.individuals))]
-                [self.individuals[i].opp_plan.pop(0) for i in range(len(self.individuals))]
-
-                # Update individual's game and boards as well.
-                # Check if new board configs create validity problems in remaining; remove and replace invalid individuals.
-                for i in range(len(self.individuals)):
-                    self.individuals[i].game = self.game
-                    self.individuals[i].board = self.board
-
-                    # Append a valid (Neural network output) final action to the individual, completing the shift buffer.
-                    _, _ = self.individuals[
-                        i].append_next_action_from_nn()  # next action for players are already handled.
+                self.shift_plans()
 
                 # print(self.debug_print_population())
                 return player_action
@@ -264,15 +395,16 @@ class RHEAPopulation:
         # Note: (Neural Network's dual usage (for both players) mimic co-evolution.)
 
         # Select best individual, get its first action:
-        player_action = self.individuals[0].action_plan[0]
+        player_action = self.individuals[self.execution_order()[0]].action_plan[0]
 
         # Play this action in the game:
         self.individuals[0].play_ply(self.game, self.board, self.player, player_action)
 
         # Play opponent action optimized by neural network:
         # Play a best policy valid move for the opponent:
-        action_opponent, valid_action_indices, fitness = \
-            self.individuals[0].plan_valid_ply(self.game, self.board, -self.player)
+        # (through the symmetry cache of the plans when nnet is also the fitness network, so they agree with it)
+        action_opponent, valid_action_indices, fitness = self.individuals[0].plan_valid_ply(
+            self.game, self.board, -self.player, nnet=self.evaluator if self.nnet is self.fitness_nnet else self.nnet)
 
         # print('Debug - Individual Plan: ', self.individuals[0].get_gene())
         # print('Debug - RHEA (+1) Action Executed: ', player_action)
@@ -282,17 +414,7 @@ class RHEAPopulation:
         self.individuals[0].play_ply(self.game, self.board, -self.player, action_opponent)
 
         # Pop all initial actions of all individuals, append a neural network based output at the end
-        [self.individuals[i].action_plan.pop(0) for i in range(len(self.individuals))]
-        [self.individuals[i].opp_plan.pop(0) for i in range(len(self.individuals))]
-
-        # Update individual's game and boards as well.
-        # Check if new board configs create validity problems in remaining; remove and replace invalid individuals.
-        for i in range(len(self.individuals)):
-            self.individuals[i].game = self.game
-            self.individuals[i].board = self.board
-
-            # Append a valid (Neural network output) final action to the individual, completing the shift buffer.
-            _, _ = self.individuals[i].append_next_action_from_nn()  # next action for players are already handled.
+        self.shift_plans()
 
         # print(self.debug_print_population())
         return player_action, action_opponent
@@ -304,7 +426,7 @@ class RHEAPopulation:
         #     print('Individual ', i+1)
         #     print(self.individuals[i].get_gene())
         print('Fitness:', self.individuals[0].get_fitness())
-        print(np.array(self.individuals[0].board.pieces))
+        print(self.individuals[0].board.pieces)
         print('Score for RHEA Agent: ', self.game.getScore(self.individuals[0].board.pieces, self.player))
         print("*******************************************************************")
 
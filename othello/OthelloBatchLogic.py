@@ -0,0 +1,99 @@
+'''
+Vectorized Othello rules for a batch of boards.
+Boards are (B,n,n) arrays with 1=white, -1=black, 0=empty (same layout as
+OthelloLogic.Board.pieces), players and actions are (B,) vectors.
+Every rule is computed with whole-batch NumPy shift/mask operations; the only
+Python loops are over the 8 directions and the ray length, never over boards.
+'''
+import numpy as np
+
+# list of all 8 directions on the board, as (x,y) offsets (same order as OthelloLogic.Board)
+directions = [(1, 1), (1, 0), (1, -1), (0, -1), (-1, -1), (-1, 0), (-1, 1), (0, 1)]
+
+
+def _shift(squares, direction):
+    """ Moves every square of a (B,n,n) mask one step along direction; squares leaving the board are dropped. """
+    dx, dy = direction
+    n = squares.shape[1]
+    shifted = np.zeros_like(squares)
+    shifted[:, max(dx, 0):n + min(dx, 0), max(dy, 0):n + min(dy, 0)] = \
+        squares[:, max(-dx, 0):n - max(dx, 0), max(-dy, 0):n - max(dy, 0)]
+    return shifted
+
+
+def _own_opp(boards, players):
+    """ Returns the (B,n,n) masks of the pieces of the players and of their opponents. """
+    players = np.asarray(players).reshape(-1, 1, 1)
+    return boards == players, boards == -players
+
+
+def legal_moves(own, opp):
+    """ Returns the (B,n,n) mask of legal moves for the side owning the pieces in own. """
+    n = own.shape[1]
+    empty = ~(own | opp)
+    moves = np.zeros_like(own)
+    for direction in directions:
+        run = _shift(own, direction) & opp
+        for _ in range(n - 2):  # at most n-2 opponent pieces can be bracketed along a line.
+            if not run.any():
+                break
+            step = _shift(run, direction)
+            moves |= step & empty
+            run = step & opp
+    return moves
+
+
+def valid_moves(boards, players):
+    """ Returns the (B,n*n+1) valid move vectors (last entry is the no-op action, valid only without moves). """
+    boards = np.asarray(boards)
+    own, opp = _own_opp(boards, players)
+    moves = legal_moves(own, opp).reshape(len(boards), -1)
+    valids = np.zeros((len(boards), moves.shape[1] + 1), dtype=np.int8)
+    valids[:, :-1] = moves
+    valids[:, -1] = ~moves.any(axis=1)
+    return valids
+
+
+def execute_moves(boards, players, actions):
+    """ Returns the boards after each player played its action; actions equal to n*n are no-ops.
+
+    Matches OthelloLogic.Board.execute_move: the piece is placed when any ray from it reaches
+    one of its own pieces over zero or more opponent pieces, and nothing changes otherwise.
+    """
+    boards = np.asarray(boards)
+    size, n = boards.shape[0], boards.shape[1]
+    own, opp = _own_opp(boards, players)
+
+    # One-hot of the played square; the no-op column is dropped, so passes place nothing.
+    origin = np.zeros((size, n * n + 1), dtype=bool)
+    origin[np.arange(size), np.asarray(actions, dtype=np.int64)] = True
+    origin = origin[:, :-1].reshape(size, n, n)
+
+    changed = np.zeros_like(own)
+    placed = np.zeros(size, dtype=bool)
+    for direction in directions:
+        square = _shift(origin, direction)
+        run = np.zeros_like(own)
+        closed = np.zeros(size, dtype=bool)
+        for _ in range(n - 1):
+            # The walk only continues over opponent pieces, so an own piece can only be met where it stops.
+            closed |= (square & own).any(axis=(1, 2))
+            square &= opp
+            if not square.any():
+                break
+            run |= square
+            square = _shift(square, direction)
+        changed |= run & closed[:, None, None]
+        placed |= closed
+
+    changed |= origin & placed[:, None, None]
+    return np.where(changed, np.asarray(players, dtype=boards.dtype).reshape(-1, 1, 1), boards)
+
+
+def game_ended(boards, players):
+    """ Returns the (B,) results: 0 if not ended, 1 if player won, -1 if player lost (or drew). """
+    boards = np.asarray(boards)
+    own, opp = _own_opp(boards, players)
+    ongoing = legal_moves(own, opp).any(axis=(1, 2)) | legal_moves(opp, own).any(axis=(1, 2))
+    diff = own.sum(axis=(1, 2), dtype=np.int64) - opp.sum(axis=(1, 2), dtype=np.int64)
+    return np.where(ongoing, 0, np.where(diff > 0, 1, -1))
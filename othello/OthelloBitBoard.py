@@ -0,0 +1,260 @@
+'''
+Bitboard implementation of the Othello rules.
+Drop-in replacement for othello.OthelloLogic.Board:
+  The position is kept as two integer masks, one per color.
+  Bit (n*x + y) is set when square (x,y) holds a piece of that color, so bit
+  indices are the same as action indices and as board.ravel() indices.
+Moves and flips are generated with shift-and-mask operations instead of
+walking the board square by square.
+'''
+import sys
+
+import numpy as np
+
+
+def _square_table(value):
+    """ bytes.translate table mapping the low byte of value to b'1' and every other byte to b'0'. """
+    table = bytearray(b'0' * 256)
+    table[value & 0xff] = ord('1')
+    return bytes(table)
+
+
+class BitBoard:
+
+    # list of all 8 directions on the board, as (x,y) offsets (same order as OthelloLogic.Board)
+    __directions = [(1, 1), (1, 0), (1, -1), (0, -1), (-1, -1), (-1, 0), (-1, 1), (0, 1)]
+
+    # (full, direction masks) and per-square rays cached per board size, shared by all instances.
+    __masks = {}
+    __rays = {}
+
+    # translate tables used to read the masks straight out of the raw bytes of an integer numpy board.
+    __white_table = _square_table(1)
+    __black_table = _square_table(-1)
+
+    __slots__ = ('n', 'white', 'black', '_full', '_shifts')
+
+    def __init__(self, n):
+        """Set up initial board configuration."""
+
+        self.n = n
+        self._full, self._shifts = BitBoard._get_masks(n)
+
+        # Set up the initial 4 pieces.
+        half = int(n / 2)
+        self.white = (1 << (n * (half - 1) + half)) | (1 << (n * half + half - 1))
+        self.black = (1 << (n * (half - 1) + half - 1)) | (1 << (n * half + half))
+
+    @staticmethod
+    def _get_masks(n):
+        """ Returns the full board mask and the (shift, mask) pair of every direction for board size n. """
+        if n not in BitBoard.__masks:
+            full = (1 << (n * n)) - 1
+            not_first_col = 0   # squares with y != 0
+            not_last_col = 0    # squares with y != n-1
+            for x in range(n):
+                for y in range(n):
+                    if y != 0:
+                        not_first_col |= 1 << (n * x + y)
+                    if y != n - 1:
+                        not_last_col |= 1 << (n * x + y)
+
+            # Moving by dy=+1 must not land on column 0 (wrapped from the previous row), and vice versa.
+            shifts = []
+            for dx, dy in BitBoard.__directions:
+                mask = full
+                if dy == 1:
+                    mask &= not_first_col
+                elif dy == -1:
+                    mask &= not_last_col
+                shifts.append((dx * n + dy, mask))
+            BitBoard.__masks[n] = (full, tuple(shifts))
+        return BitBoard.__masks[n]
+
+    @classmethod
+    def from_pieces(cls, n, pieces):
+        """Builds a bitboard from an (n,n) array of 1/-1/0 pieces."""
+        b = cls.__new__(cls)
+        b.n = n
+        b._full, b._shifts = BitBoard._get_masks(n)
+        b.white, b.black = BitBoard.pieces_to_masks(pieces)
+        return b
+
+    @classmethod
+    def from_masks(cls, n, white, black):
+        """Builds a bitboard from the white and black masks."""
+        b = cls.__new__(cls)
+        b.n = n
+        b._full, b._shifts = BitBoard._get_masks(n)
+        b.white, b.black = white, black
+        return b
+
+    @staticmethod
+    def pieces_to_masks(pieces):
+        """Returns the (white, black) masks of an (n,n) array of 1/-1/0 pieces."""
+        pieces = np.asarray(pieces)
+        if pieces.dtype.kind != 'i':
+            flat = pieces.ravel()
+            return BitBoard.array_to_mask(flat == 1), BitBoard.array_to_mask(flat == -1)
+
+        # One byte per square (the low byte of each item), reversed so that square 0 is the last digit.
+        size = pieces.itemsize
+        raw = pieces.tobytes()[(0 if sys.byteorder == 'little' else size - 1)::size][::-1]
+        return int(raw.translate(BitBoard.__white_table), 2), int(raw.translate(BitBoard.__black_table), 2)
+
+    @property
+    def pieces(self):
+        """The position as an (n,n) numpy array (1=white, -1=black, 0=empty)."""
+        return (self.mask_to_array(self.white, self.n * self.n) -
+                self.mask_to_array(self.black, self.n * self.n)).reshape(self.n, self.n)
+
+    @pieces.setter
+    def pieces(self, pieces):
+        self.white, self.black = BitBoard.pieces_to_masks(pieces)
+
+    @staticmethod
+    def array_to_mask(flags):
+        """Packs a flat boolean array into an integer mask; element i becomes bit i."""
+        return int.from_bytes(np.packbits(flags, bitorder='little').tobytes(), 'little')
+
+    @staticmethod
+    def mask_to_array(mask, size):
+        """Unpacks an integer mask into a flat int8 array of 0/1 of the given size."""
+        raw = np.frombuffer(mask.to_bytes((size + 7) // 8, 'little'), dtype=np.uint8)
+        return np.unpackbits(raw, bitorder='little')[:size].astype(np.int8)
+
+    # add [][] indexer syntax to the Board
+    def __getitem__(self, index):
+        return self.pieces[index]
+
+    def _own_opp(self, color):
+        return (self.white, self.black) if color == 1 else (self.black, self.white)
+
+    def countDiff(self, color):
+        """Counts the # pieces of the given color
+        (1 for white, -1 for black, 0 for empty spaces)"""
+        own, opp = self._own_opp(color)
+        return bin(own).count('1') - bin(opp).count('1')
+
+    def legal_moves_mask(self, color):
+        """Returns the legal moves for the given color as a bit mask."""
+        own, opp = self._own_opp(color)
+        empty = ~(own | opp) & self._full
+        moves = 0
+        for shift, mask in self._shifts:
+            if shift > 0:
+                run = (own << shift) & mask & opp
+                while run:
+                    nxt = (run << shift) & mask
+                    moves |= nxt & empty
+                    run = nxt & opp
+            else:
+                run = (own >> -shift) & mask & opp
+                while run:
+                    nxt = (run >> -shift) & mask
+                    moves |= nxt & empty
+                    run = nxt & opp
+        return moves
+
+    @staticmethod
+    def mask_indices(mask):
+        """Yields the indices of the set bits of mask in increasing order."""
+        while mask:
+            low = mask & -mask
+            yield low.bit_length() - 1
+            mask ^= low
+
+    def get_legal_moves(self, color):
+        """Returns all the legal moves for the given color.
+        (1 for white, -1 for black
+        """
+        n = self.n
+        return [(idx // n, idx % n) for idx in self.mask_indices(self.legal_moves_mask(color))]
+
+    def has_legal_moves(self, color):
+        return self.legal_moves_mask(color) != 0
+
+    def flips_mask(self, move, color):
+        """Returns the mask of squares changed by playing move (x,y) with color, including the
+        placed piece itself, or 0 when the move changes nothing.
+
+        Matches OthelloLogic.Board.execute_move: the piece is placed when any ray from it reaches
+        one of its own pieces over zero or more opponent pieces.
+        """
+        own, opp = self._own_opp(color)
+        return BitBoard.get_flips(self.n, own, opp, int(self.n * move[0] + move[1]))
+
+    @staticmethod
+    def get_flips(n, own, opp, origin):
+        """ flips_mask on raw masks: own/opp are the masks of the mover and its opponent,
+        origin is the bit index (action) of the placed piece. """
+        flips = 0
+        placed = False
+        for neighbour, ray, up in BitBoard._get_rays(n)[origin]:
+            if neighbour & opp:
+                blockers = ray & ~opp
+                if up:
+                    # Ray towards higher bit indices: the closest non-opponent square is the lowest set bit.
+                    first = blockers & -blockers
+                    if first & own:
+                        flips |= ray & (first - 1)
+                        placed = True
+                elif blockers:
+                    # Ray towards lower bit indices: the closest non-opponent square is the highest set bit.
+                    first = 1 << (blockers.bit_length() - 1)
+                    if first & own:
+                        flips |= ray & ~((first << 1) - 1)
+                        placed = True
+            elif neighbour & own:
+                placed = True
+        return flips | (1 << origin) if placed else 0
+
+    @staticmethod
+    def _get_rays(n):
+        """ Returns, for every square, a (neighbour, ray, up) tuple per direction: the mask of the adjacent
+        square, the mask of all squares along the direction (excluding the square) and whether the
+        direction goes towards higher bit indices. """
+        if n not in BitBoard.__rays:
+            rays = []
+            for x in range(n):
+                for y in range(n):
+                    square_rays = []
+                    for dx, dy in BitBoard.__directions:
+                        ray = 0
+                        i, j = x + dx, y + dy
+                        while 0 <= i < n and 0 <= j < n:
+                            ray |= 1 << (n * i + j)
+                            i, j = i + dx, j + dy
+                        if ray:
+                            neighbour = 1 << (n * (x + dx) + y + dy)
+                            square_rays.append((neighbour, ray, dx * n + dy > 0))
+                    rays.append(tuple(square_rays))
+            BitBoard.__rays[n] = tuple(rays)
+        return BitBoard.__rays[n]
+
+    def execute_move(self, move, color):
+        """Perform the given move on the board; flips pieces as necessary.
+        color gives the color pf the piece to play (1=white,-1=black)
+        :return: mask of the squares that now hold color (0 if nothing changed).
+        """
+        if move == (self.n, 0):  # no-op (pass) action.
+            return 0
+        flips = self.flips_mask(move, color)
+        if color == 1:
+            self.white |= flips
+            self.black &= ~flips
+        else:
+            self.black |= flips
+            self.white &= ~flips
+        return flips
+
+    def make_move(self, move, color):
+        """Plays the move in place like execute_move and returns the undo record for unmake_move:
+        the (white, black) masks before the move."""
+        undo = (self.white, self.black)
+        self.execute_move(move, color)
+        return undo
+
+    def unmake_move(self, undo):
+        """Takes back a move played with make_move, given its undo record."""
+        self.white, self.black = undo
@@ -2,7 +2,11 @@ from __future__ import print_function
 import sys
 import numpy as np
 from core_game.Game import Game
+from core_game.TranspositionTable import RulesEntry, shared_table
+from othello import OthelloBatchLogic
+from othello.OthelloBitBoard import BitBoard
 from othello.OthelloLogic import Board
+from othello.OthelloZobrist import ZobristHash
 
 
 sys.path.append('../apocrita_az')
@@ -18,13 +22,29 @@ class OthelloGame(Game):
     def getSquarePiece(piece):
         return OthelloGame.square_content[piece]
 
-    def __init__(self, n):
+    def __init__(self, n, bitboard=False, use_table=True):
         self.n = n
+        self.bitboard = bitboard  # Use the bitboard move engine (OthelloBitBoard) instead of OthelloLogic.Board.
+        self.zobrist = ZobristHash(n)  # Position keys used by stringRepresentation and the search caches.
+        # Process-wide transposition table caching valid moves and game ends (None: recompute every call).
+        self.table = shared_table if use_table else None
 
-    def getInitBoard(self):
-        # return initial board (numpy board)
+        # Square permutation of each of the 8 symmetries, in getSymmetries order: sym.ravel() == board.ravel()[perm]
+        squares = np.arange(n * n).reshape(n, n)
+        self.symmetry_perms = np.array([(np.fliplr(np.rot90(squares, i)) if j else np.rot90(squares, i)).ravel()
+                                        for i in range(1, 5) for j in [True, False]])
+
+    def _get_board(self, board):
+        """ Wraps a numpy board into the selected rule engine. """
+        if self.bitboard:
+            return BitBoard.from_pieces(self.n, board)
         b = Board(self.n)
-        return np.array(b.pieces)
+        b.pieces = np.array(board, dtype=np.int8)
+        return b
+
+    def getInitBoard(self):
+        # return initial board (numpy int8 board)
+        return Board(self.n).pieces
 
     def getBoardSize(self):
         # (a,b) tuple
@@ -39,14 +59,98 @@ class OthelloGame(Game):
         # action must be a valid move
         if action == self.n * self.n:  # 0-35 are board positions for a 6x6 board; 37th tile is idx 36; which is a noop.
             return (board, -player)
-        b = Board(self.n)
-        b.pieces = np.copy(board)
+        if self.bitboard:
+            return self._execute_bitboard(board, player, action)[0], -player
         move = (int(action / self.n), action % self.n)
+        b = self._get_board(board)
         b.execute_move(move, player)
         return b.pieces, -player
 
-    def getValidMoves(self, board, player):
+    def _execute_bitboard(self, board, player, action):
+        """ Plays action with the bitboard engine; returns the next board and the mask of changed squares. """
+        pieces = np.array(board, dtype=np.int8)
+        return pieces, self.makeMove(pieces, player, action)[2]
+
+    def makeMove(self, board, player, action):
+        # Plays action on the numpy board in place (no board is allocated) and returns the undo record
+        # (action, player, mask of changed squares, previous content of the action square) for unmakeMove.
+        if action == self.n * self.n:
+            return action, player, 0, 0
+        action = int(action)
+        white, black = BitBoard.pieces_to_masks(board)
+        own, opp = (white, black) if player == 1 else (black, white)
+        changed = BitBoard.get_flips(self.n, own, opp, action)
+
+        # Only the changed squares are written.
+        previous = board.flat[action]
+        for idx in BitBoard.mask_indices(changed):
+            board.flat[idx] = player
+        return action, player, changed, previous
+
+    def unmakeMove(self, board, undo):
+        # Takes back, in place, a move played with makeMove.
+        action, player, changed, previous = undo
+        if changed:
+            for idx in BitBoard.mask_indices(changed):
+                board.flat[idx] = -player
+            board.flat[action] = previous
+
+    def getMoveHash(self, h, undo):
+        # Hash after the move of the undo record, given the hash h of the position it was played from.
+        action, player, changed, _ = undo
+        return self.zobrist.update(h, player, action, changed)
+
+    def getNextStateHash(self, board, player, action, h):
+        # getNextState that also returns the hash of the next position, updated from the squares the move
+        # changed. h must be getHash(board, player).
+        if action == self.n * self.n:
+            return board, -player, self.zobrist.update(h, player, action, 0)
+        if self.bitboard:
+            pieces, changed = self._execute_bitboard(board, player, action)
+        else:
+            pieces, _ = self.getNextState(board, player, action)
+            changed = BitBoard.array_to_mask((pieces != board).ravel())
+        return pieces, -player, self.zobrist.update(h, player, int(action), changed)
+
+    def getRules(self, board, player, key=None):
+        # RulesEntry (legal move mask, pass flag, getGameEnded result) of board for player, served from the
+        # transposition table when possible. key is getHash(board, player) if the caller already has it.
+        # Misses are computed with the selected rule engine.
+        masks = None
+        if key is None:
+            masks = BitBoard.pieces_to_masks(board)
+            key = self.zobrist.hash_masks(masks[0], masks[1], player)
+        entry = self.table.get(key)
+        if entry is None:
+            # Both sides' moves are generated at most once per position (getGameEnded used to scan twice).
+            if self.bitboard:
+                b = BitBoard.from_masks(self.n, *masks) if masks else BitBoard.from_pieces(self.n, board)
+                moves = b.legal_moves_mask(player)
+            else:
+                b = self._get_board(board)
+                moves = 0
+                for x, y in b.get_legal_moves(player):
+                    moves |= 1 << (self.n * x + y)
+            ended = 0
+            if moves == 0 and not b.has_legal_moves(-player):
+                ended = 1 if b.countDiff(player) > 0 else -1
+            entry = RulesEntry(moves, moves == 0, ended)
+            self.table.put(key, entry)
+        return entry
+
+    def _valids_from_mask(self, moves):
+        valids = np.zeros(self.getActionSize(), dtype=int)
+        for idx in BitBoard.mask_indices(moves):
+            valids[idx] = 1
+        valids[-1] = moves == 0
+        return valids
+
+    def getValidMoves(self, board, player, key=None):
         # return a fixed size binary vector
+        if self.table is not None:
+            return self._valids_from_mask(self.getRules(board, player, key).moves)
+        if self.bitboard:
+            return self._valids_from_mask(BitBoard.from_pieces(self.n, board).legal_moves_mask(player))
         valids = [0] * self.getActionSize()
         b = Board(self.n)
         b.pieces = np.copy(board)  # fixed point to object problem.
@@ -58,11 +162,12 @@ class OthelloGame(Game):
             valids[self.n * x + y] = 1
         return np.array(valids)
 
-    def getGameEnded(self, board, player):
+    def getGameEnded(self, board, player, key=None):
         # return 0 if not ended, 1 if player 1 won, -1 if player 1 lost
         # player = 1
-        b = Board(self.n)
-        b.pieces = np.copy(board)
+        if self.table is not None:
+            return self.getRules(board, player, key).ended
+        b = self._get_board(board)
         if b.has_legal_moves(player):
             return 0
         if b.has_legal_moves(-player):
@@ -71,9 +176,29 @@ class OthelloGame(Game):
             return 1
         return -1
 
-    def getCanonicalForm(self, board, player):
+    def getValidMovesBatch(self, boards, players):
+        # (B,n,n) boards, (B,) players -> (B, n*n+1) binary valid move vectors
+        return OthelloBatchLogic.valid_moves(boards, players)
+
+    def getNextStateBatch(self, boards, players, actions):
+        # (B,n,n) boards, (B,) players and actions -> (B,n,n) next boards, (B,) next players
+        # actions must be valid moves; n*n is the no-op.
+        players = np.asarray(players)
+        return OthelloBatchLogic.execute_moves(boards, players, actions), -players
+
+    def getGameEndedBatch(self, boards, players):
+        # (B,n,n) boards, (B,) players -> (B,) results with the same meaning as getGameEnded
+        return OthelloBatchLogic.game_ended(boards, players)
+
+    def getCanonicalForm(self, board, player, out=None):
         # return state if player==1, else return -state if player==-1
-        return player * board
+        # Always a new array, so callers may keep or modify it. With out the canonical form is written there
+        # instead; out=board converts the board in place, without copying. Callers that convert every turn and
+        # only read the result (MCTS, Arena, RHEA's execution_order) pass a buffer of their own as out.
+        if out is None:
+            return np.array(board) if player == 1 else np.negative(board)
+        np.multiply(board, player, out=out)
+        return out
 
     def getSymmetries(self, board, pi):
         # mirror, rotational
@@ -91,16 +216,59 @@ class OthelloGame(Game):
                 l += [(newB, list(newPi.ravel()) + [pi[-1]])]
         return l
 
+    def getCanonicalSymmetry(self, board):
+        # The symmetric variant of board with the smallest hash: returns (its key, the board, symmetry index t).
+        # All 8 symmetric positions map to the same key, so caches keyed on it share one entry.
+        boards = np.asarray(board).reshape(-1)[self.symmetry_perms]
+        keys = self.zobrist.hash_many(boards)
+        t = int(np.argmin(keys))
+        return int(keys[t]), boards[t].reshape(self.n, self.n), t
+
+    def transformPolicy(self, pi, t):
+        # policy of a board -> policy of its symmetric variant t (the pass action is unchanged)
+        pi = np.asarray(pi)
+        return np.append(pi[:-1][self.symmetry_perms[t]], pi[-1])
+
+    def untransformPolicy(self, pi, t):
+        # policy of symmetric variant t -> policy of the original board (inverse of transformPolicy)
+        pi = np.asarray(pi)
+        original = np.empty_like(pi)
+        original[self.symmetry_perms[t]] = pi[:-1]
+        original[-1] = pi[-1]
+        return original
+
     def stringRepresentation(self, board):
-        return board.tostring()
+        return self.getHash(board)
+
+    def getHash(self, board, player=1):
+        # 64-bit Zobrist key (plain int) of board with player to move.
+        return self.zobrist.hash(board, player)
+
+    def getCanonicalHash(self, board, player, h, occupancy=None):
+        # Key of getCanonicalForm(board, player) given the key h of (board, player). For player -1 the colors
+        # are swapped through the key of the occupied squares; pass it as occupancy (getOccupancy, updated with
+        # getMoveOccupancy) to avoid rehashing the board.
+        if player == 1:
+            return h
+        if occupancy is None:
+            occupancy = self.zobrist.occupancy(board)
+        return h ^ self.zobrist.side ^ occupancy
+
+    def getOccupancy(self, board):
+        # Key of the occupied squares of board, the same for board and -board.
+        return self.zobrist.occupancy(board)
+
+    def getMoveOccupancy(self, occupancy, undo):
+        # getOccupancy after the move of the undo record: only the placed square becomes occupied.
+        action, _, changed, _ = undo
+        return occupancy ^ self.zobrist.swap[action] if changed else occupancy
 
     def stringRepresentationReadable(self, board):
         board_s = "".join(self.square_content[square] for row in board for square in row)
         return board_s
 
     def getScore(self, board, player):
-        b = Board(self.n)
-        b.pieces = np.copy(board)
+        b = self._get_board(board)
         return b.countDiff(player)
 
     @staticmethod
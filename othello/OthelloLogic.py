@@ -9,7 +9,10 @@ Board data:
      at the opposite end of the board in row 8.
 Squares are stored and manipulated as (x,y) tuples.
 x is the column, y is the row.
+pieces is a contiguous (n,n) int8 numpy array, the board type used
+everywhere (OthelloGame, MCTS, RHEA), so boards are never converted.
 '''
+import numpy as np
 
 
 class Board:
@@ -22,9 +25,7 @@ class Board:
 
         self.n = n
         # Create the empty board array.
-        self.pieces = [None]*self.n
-        for i in range(self.n):
-            self.pieces[i] = [0]*self.n
+        self.pieces = np.zeros((self.n, self.n), dtype=np.int8)
 
         # Set up the initial 4 pieces.
         self.pieces[int(self.n/2)-1][int(self.n/2)] = 1
@@ -110,12 +111,38 @@ class Board:
         # print(move)
         flips = [flip for direction in self.__directions
                       for flip in self._get_flips(move, direction, color)]
-        if len(list(flips))==0 or move == (6,0):  # at least one flip has to be possible or
+        if len(list(flips))==0 or move == (self.n,0):  # at least one flip has to be possible or not a no-op action
             return
         for x, y in flips:
             # print(self[x][y], color)
             self[x][y] = color
 
+    def make_move(self, move, color):
+        """Plays the move in place like execute_move and returns a compact undo
+        record (move, color, previous content of the move square, flipped squares)
+        for unmake_move. The previous content is None if the board did not change."""
+        if move == (self.n, 0):  # no-op action
+            return move, color, None, []
+        rays = [self._get_flips(move, direction, color) for direction in self.__directions]
+        if not any(rays):
+            return move, color, None, []
+        x, y = move
+        previous = self[x][y]
+        flips = [square for ray in rays for square in ray[1:]]  # ray[0] is the move square itself
+        for fx, fy in flips:
+            self[fx][fy] = color
+        self[x][y] = color
+        return move, color, previous, flips
+
+    def unmake_move(self, undo):
+        """Takes back a move played with make_move, given its undo record."""
+        (x, y), color, previous, flips = undo
+        if previous is None:
+            return
+        for fx, fy in flips:
+            self[fx][fy] = -color
+        self[x][y] = previous
+
     def _discover_move(self, origin, direction):
         """ Returns the endpoint for a legal move, starting at the given origin,
         moving by the given increment."""
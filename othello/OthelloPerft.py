@@ -0,0 +1,68 @@
+'''
+Perft (performance test) for the Othello rule engines.
+Counts the leaf positions of the game tree to a fixed depth from
+OthelloGame.getInitBoard(). A pass (action n*n) is a ply of its own, exactly as
+getNextState plays it, and finished games count as a leaf where they end.
+Counts are checked against recorded values, so a faster engine is only
+trusted once it reproduces them, and timings are taken on the same workload.
+'''
+import time
+
+import numpy as np
+
+# Recorded leaf counts for depth 1, 2, ... (the 8x8 values are the published Othello perft numbers).
+REFERENCE_COUNTS = {
+    6: [4, 12, 56, 244, 1364, 7604, 47740, 308716, 2114912],
+    8: [4, 12, 56, 244, 1396, 8200, 55092, 390216, 3005288],
+}
+
+
+def perft(game, board, player, depth):
+    """ Number of leaf positions depth plies below board, with player to move. """
+    if depth == 0 or game.getGameEnded(board, player) != 0:
+        return 1
+    nodes = 0
+    for action in np.flatnonzero(game.getValidMoves(board, player)):
+        next_board, next_player = game.getNextState(board, player, action)
+        nodes += perft(game, next_board, next_player, depth - 1)
+    return nodes
+
+
+def perft_batch(game, depth):
+    """ perft from the initial position computed level by level with the batched rule API. """
+    boards = game.getInitBoard()[np.newaxis]
+    players = np.ones(1, dtype=np.int64)
+    leaves = 0
+    for _ in range(depth):
+        # Finished games are leaves of the level they end on.
+        ongoing = game.getGameEndedBatch(boards, players) == 0
+        leaves += int(np.count_nonzero(~ongoing))
+        boards, players = boards[ongoing], players[ongoing]
+
+        parents, actions = np.nonzero(game.getValidMovesBatch(boards, players))
+        boards, players = game.getNextStateBatch(boards[parents], players[parents], actions)
+    return leaves + len(boards)
+
+
+def run(game, max_depth, batch=False, verbose=True):
+    """
+    Runs perft for depths 1..max_depth and checks the counts against REFERENCE_COUNTS.
+    :return: list of (depth, nodes, seconds, nodes per second); raises AssertionError on a mismatch.
+    """
+    reference = REFERENCE_COUNTS.get(game.n, [])
+    results = []
+    for depth in range(1, max_depth + 1):
+        start = time.perf_counter()
+        if batch:
+            nodes = perft_batch(game, depth)
+        else:
+            nodes = perft(game, game.getInitBoard(), 1, depth)
+        elapsed = time.perf_counter() - start
+        results.append((depth, nodes, elapsed, nodes / elapsed if elapsed > 0 else float('inf')))
+        if verbose:
+            print('n={} depth={} nodes={} time={:.3f}s nodes/s={:.0f}'.format(game.n, *results[-1]))
+        if depth <= len(reference):
+            assert nodes == reference[depth - 1], \
+                'perft({}) on {}x{} gave {} nodes, expected {}'.format(depth, game.n, game.n, nodes,
+                                                                       reference[depth - 1])
+    return results
@@ -0,0 +1,83 @@
+'''
+Zobrist hashing for Othello positions.
+Every (square, color) pair gets a random 64-bit key and the hash of a position
+is the XOR of the keys of its pieces, plus a side key when black (-1) is to move.
+Playing a move only changes the placed square and the flipped squares, so the
+hash of the next position is updated from the flips instead of recomputed.
+Keys are plain Python ints, usable directly as dict keys.
+'''
+import numpy as np
+
+from othello.OthelloBitBoard import BitBoard
+
+
+class ZobristHash:
+
+    def __init__(self, n, seed=0):
+        """ Draws the keys for an n x n board; the same seed gives the same keys in every process. """
+        self.n = n
+        rng = np.random.default_rng([seed, n])  # keys of different board sizes never coincide.
+        keys = rng.integers(0, 2 ** 64, size=(2, n * n), dtype=np.uint64)
+        self._keys = keys                           # (2, n*n) uint64 copy for vectorized hashing
+        self.white = [int(k) for k in keys[0]]      # key of a white (1) piece on each square
+        self.black = [int(k) for k in keys[1]]      # key of a black (-1) piece on each square
+        self.swap = [w ^ b for w, b in zip(self.white, self.black)]  # toggles a square between colors
+        self.side = int(rng.integers(0, 2 ** 64, dtype=np.uint64))   # black to move
+
+        # XOR of the keys of every 8-square group, so masks are hashed one byte at a time.
+        self._white_bytes = self._byte_tables(self.white)
+        self._black_bytes = self._byte_tables(self.black)
+        self._swap_bytes = self._byte_tables(self.swap)
+
+    @staticmethod
+    def _byte_tables(keys):
+        keys = list(keys) + [0] * (-len(keys) % 8)
+        tables = []
+        for offset in range(0, len(keys), 8):
+            table = [0] * 256
+            for byte in range(1, 256):
+                low = byte & -byte
+                table[byte] = table[byte ^ low] ^ keys[offset + low.bit_length() - 1]
+            tables.append(table)
+        return tables
+
+    @staticmethod
+    def _hash_mask(mask, tables):
+        h = 0
+        for table in tables:
+            h ^= table[mask & 0xff]
+            mask >>= 8
+        return h
+
+    def hash_masks(self, white, black, player=1):
+        """ Hash of the position given by the white and black bit masks with player to move. """
+        h = self._hash_mask(white, self._white_bytes) ^ self._hash_mask(black, self._black_bytes)
+        return h if player == 1 else h ^ self.side
+
+    def hash(self, board, player=1):
+        """ Hash of an (n,n) board with player to move. """
+        white, black = BitBoard.pieces_to_masks(board)
+        return self.hash_masks(white, black, player)
+
+    def hash_many(self, boards, player=1):
+        """ Hashes of a (B, n*n) or (B,n,n) stack of boards with player to move, as a uint64 array. """
+        flat = np.asarray(boards).reshape(len(boards), -1)
+        zero = np.uint64(0)
+        keys = np.where(flat == 1, self._keys[0], zero) ^ np.where(flat == -1, self._keys[1], zero)
+        h = np.bitwise_xor.reduce(keys, axis=1)
+        return h if player == 1 else h ^ np.uint64(self.side)
+
+    def occupancy(self, board):
+        """ XOR of the swap keys of the occupied squares: hash(board) ^ occupancy(board) == hash(-board). """
+        white, black = BitBoard.pieces_to_masks(board)
+        return self._hash_mask(white | black, self._swap_bytes)
+
+    def update(self, h, player, action, changed):
+        """ Hash after player played action, given the hash h before the move and the mask of the squares
+        the move changed (the placed piece and the flips, as returned by BitBoard.execute_move). """
+        h ^= self.side
+        if changed:
+            placed = 1 << action
+            h ^= (self.white if player == 1 else self.black)[action]
+            h ^= self._hash_mask(changed & ~placed, self._swap_bytes)
+        return h
@@ -0,0 +1,88 @@
+"""
+Memory-mapped checkpoint format: raw tensor bytes behind a small header, so that loading maps the file and
+returns tensors that are views of the mapping instead of unpickling and copying every weight.
+
+Layout: MAGIC, the header length (uint64, little endian), the JSON header, then the bytes of every tensor in
+C order, each starting at a multiple of ALIGNMENT. The header holds the architecture args of the network and,
+per tensor, its name, dtype, shape and offset.
+
+The mapping is private (copy-on-write): pages stay shared with the page cache, and with every other process
+that maps the same file, until a process writes to a tensor (e.g. trains), which copies only the written
+pages; the file itself is never modified.
+
+POSIX only: saving renames the new file over the old one while processes may still map it, which Windows refuses.
+"""
+
+import json
+import mmap
+import os
+import struct
+
+import torch
+
+MAGIC = b'OTHELLO-MAPPED-CHECKPOINT-1\n'
+ALIGNMENT = 64
+
+
+def save(filepath, state_dict, net_args):
+    """
+    Writes state_dict (name -> tensor) and the json-serializable dict net_args to filepath. The file is written
+    aside and then renamed over filepath, so mappings of a previous file of that name stay valid.
+    """
+    tensors = [(name, tensor.detach().cpu().contiguous()) for name, tensor in state_dict.items()]
+    entries = []
+    offset = 0
+    for name, tensor in tensors:
+        entries.append({'name': name, 'dtype': str(tensor.dtype).replace('torch.', ''),
+                        'shape': list(tensor.shape), 'offset': offset})
+        offset += -(-tensor.numel() * tensor.element_size() // ALIGNMENT) * ALIGNMENT
+    header = json.dumps({'net_args': net_args, 'tensors': entries}).encode()
+    data_start = _aligned(len(MAGIC) + 8 + len(header))
+
+    partial = filepath + '.partial'
+    with open(partial, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        for (name, tensor), entry in zip(tensors, entries):
+            f.seek(data_start + entry['offset'])
+            f.write(tensor.view(-1).view(torch.uint8).numpy().tobytes() if tensor.numel() else b'')
+        f.truncate(data_start + offset)
+    os.replace(partial, filepath)
+
+
+def is_mapped(filepath):
+    """ True if filepath is in this format (otherwise e.g. a torch.save pickle). """
+    with open(filepath, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def load(filepath):
+    """
+    Maps filepath and returns {'state_dict': name -> tensor view of the mapping, 'net_args': dict}, the keys
+    of a checkpoint (and of NNetWrapper.snapshot).
+    """
+    with open(filepath, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)  # the mapping outlives the file object.
+    if buffer[:len(MAGIC)] != MAGIC:
+        raise ValueError('{} is not a mapped checkpoint'.format(filepath))
+    header_size, = struct.unpack_from('<Q', buffer, len(MAGIC))
+    header = json.loads(bytes(buffer[len(MAGIC) + 8:len(MAGIC) + 8 + header_size]))
+    data_start = _aligned(len(MAGIC) + 8 + header_size)
+
+    state_dict = {}
+    for entry in header['tensors']:
+        dtype = getattr(torch, entry['dtype'])
+        count = 1
+        for size in entry['shape']:
+            count *= size
+        if count:
+            tensor = torch.frombuffer(buffer, dtype=dtype, count=count, offset=data_start + entry['offset'])
+        else:
+            tensor = torch.empty(0, dtype=dtype)
+        state_dict[entry['name']] = tensor.view(entry['shape'])
+    return {'state_dict': state_dict, 'net_args': header['net_args']}
+
+
+def _aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
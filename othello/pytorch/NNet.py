@@ -1,15 +1,26 @@
+import contextlib
+import copy
 import os
+import socket
+import threading
 import time
 
 import numpy as np
 from tqdm import tqdm
 
+from core_game.EvaluationCache import EvaluationCache
 from core_game.NeuralNet import NeuralNet
+from core_game.Telemetry import Telemetry
 
 import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
 import torch.optim as optim
+from torch.nn.parallel import DistributedDataParallel
 
 from core_game.utils import dotdict, AverageMeter
+from othello.OthelloGame import OthelloGame
+from othello.pytorch import MappedCheckpoint
 from othello.pytorch import OthelloNNet as onnet
 
 args = dotdict({
@@ -17,62 +28,141 @@ args = dotdict({
     'dropout': 0.3,
     'epochs': 50,
     'batch_size': 64,
+    'train_workers': 1,  # Training processes on this machine (>1: DistributedDataParallel over gloo, CPU only).
     'cuda': torch.cuda.is_available(),
+    'precision': 'fp32',  # 'bf16': train and predict under CPU autocast to bfloat16 (losses stay in float32).
     'num_channels': 512,
+    'fc1_size': 1024,
+    'fc2_size': 512,
+    'distill_alpha': 0.5,  # Weight of the game targets against the teacher's outputs when distilling.
+    'frozen_inference': True,  # Predict with a BatchNorm-fused (TorchScript-frozen where supported) copy.
+    'quantized_inference': False,  # Predict with an INT8 copy on CPU once calibration boards are known.
+    'calibration_size': 512,  # Number of training boards kept to calibrate the static quantization.
+    # Memory cap of the evaluation cache in front of predict (0: no cache). The 8 symmetric variants of a board share
+    # one entry, evaluated in their canonical orientation, so predict outputs differ slightly with the cache on.
+    'eval_cache_bytes': 0,
+    # save_checkpoint writes the memory-mapped format (False: torch.save pickle). POSIX only: Windows cannot replace
+    # a file that is still mapped, e.g. the checkpoint the previous network was loaded from.
+    'mapped_checkpoints': os.name == 'posix',
+    'telemetry': True,  # Aggregate inference counters and latency histograms (False: no timing at all).
+    'telemetry_flush_every': 100000,  # Write the inference metrics every N timed calls (0: only flush_metrics).
 })
 
 
+# args that define the network architecture; they are stored in checkpoints.
+ARCHITECTURE_ARGS = ('num_channels', 'fc1_size', 'fc2_size')
+
+
+def autocast(enabled=True):
+    """
+    Autocast context of args.precision: with 'bf16' on CPU, convolutions and matrix products run in bfloat16
+    (autocast keeps reductions such as log_softmax in float32); with 'fp32' or on CUDA a no-op.
+    """
+    return torch.autocast('cpu', dtype=torch.bfloat16, enabled=enabled and args.precision == 'bf16' and not args.cuda)
+
+
 class NNetWrapper(NeuralNet):
-    def __init__(self, game, writer):
+    def __init__(self, game, writer, net_args=None, empty=False):
+        """
+        empty: create the network without weights (on the meta device) for a load_checkpoint that replaces them
+        all, so that startup does not initialize weights only to throw them away.
+        """
         super().__init__(game)
-        self.nnet = onnet.OthelloNNet(game, args)
+        self.game = game
+        # args of this network's OthelloNNet; net_args overrides the architecture, e.g. for a small student net.
+        self.net_args = dotdict({**args, **(net_args or {})})
+        with torch.device('meta') if empty else contextlib.nullcontext():
+            self.nnet = onnet.OthelloNNet(game, self.net_args)
         self.board_x, self.board_y = game.getBoardSize()
         self.action_size = game.getActionSize()
         self.epoch_count = 0
         self.writer = writer
+        self.buffers = threading.local()  # Preallocated float32 input batch of forward per thread, grown on demand.
+        self.version = 0  # Incremented whenever the weights change (train, restore, load_checkpoint, share_weights).
+        self.shares_weights = False  # True while self.nnet may be the module of another wrapper (share_weights).
+        self.frozen = None  # Frozen inference module (onnet.freeze) and the weights version it was built from.
+        self.frozen_version = -1
+        self.quantized = None  # INT8 inference module (onnet.quantize), its weights version and calibration boards.
+        self.quantized_version = -1
+        self.calibration_boards = None
+        self.cache = EvaluationCache(args.eval_cache_bytes) if args.eval_cache_bytes else None
+        self.metrics = Telemetry(writer, enabled=args.telemetry, flush_every=args.telemetry_flush_every)
 
-        if args.cuda:
+        if args.cuda and not empty:
             self.nnet.cuda()
 
         writer.add_text('Learning Rate:', str(args.lr), 0)
         writer.add_text('CUDA Device:', str(args.cuda), 0)
         writer.add_text('Epochs:', str(args.epochs), 0)
         writer.add_text('Batch Size:', str(args.batch_size), 0)
-        writer.add_text('Num Channels:', str(args.num_channels), 0)
+        writer.add_text('Num Channels:', str(self.net_args.num_channels), 0)
         writer.add_text('Dropout:', str(args.dropout), 0)
+        writer.add_text('Precision:', args.precision, 0)
 
     def train(self, examples):
         """
         examples: list of examples, each example is of form (board, pi, v)
         """
-        optimizer = optim.Adam(self.nnet.parameters())
+        self.unshare_weights()
+        if args.quantized_inference:
+            sample_ids = np.random.choice(len(examples), min(len(examples), args.calibration_size), replace=False)
+            self.calibrate([examples[i][0] for i in sample_ids])
+
+        # The examples are converted once into contiguous float32 tensors (on the training device);
+        # each epoch visits them in a new random order, batch by batch, through index slices.
+        tensors = self.examples_to_tensors(examples)
+        seed = int(torch.randint(2 ** 62, (1,)))
 
         start = time.time()
+        if args.train_workers > 1 and not args.cuda:
+            losses = self.train_distributed(tensors, seed)
+        else:
+            losses = self.train_epochs(self.nnet, *tensors, seed=seed)
+        finish = time.time()
+
+        # Write losses to tensorboard:
+        for pi_loss, v_loss in losses:
+            self.epoch_count += 1
+            self.writer.add_scalar("Loss - Training (Pi): ", pi_loss, self.epoch_count)
+            self.writer.add_scalar("Loss - Training (V): ", v_loss, self.epoch_count)
+            self.writer.add_scalar("Total Loss:", pi_loss + v_loss, self.epoch_count)
+        self.writer.add_scalar("Training time (per epoch): ", finish-start)
+        self.weights_changed()
+
+    @staticmethod
+    def train_epochs(model, all_boards, all_pis, all_vs, seed, rank=0, world_size=1):
+        """
+        Trains model for args.epochs epochs on the example tensors; returns the (pi, v) loss averages of each epoch.
+        With world_size > 1, model is the DistributedDataParallel replica of worker rank: all workers draw the same
+        permutation (from seed) and split each batch of args.batch_size examples, so the global batch is unchanged.
+        """
+        optimizer = optim.Adam(model.parameters())
+        generator = torch.Generator().manual_seed(seed)
+        batch_size = args.batch_size // world_size
+
+        losses = []
         for epoch in range(args.epochs):
-            print('EPOCH ::: ' + str(epoch + 1))
-            self.nnet.train()
+            if rank == 0:
+                print('EPOCH ::: ' + str(epoch + 1))
+            model.train()
             pi_losses = AverageMeter()
             v_losses = AverageMeter()
 
-            batch_count = int(len(examples) / args.batch_size)
-
-            t = tqdm(range(batch_count), desc='Training Net')
-            for _ in t:
-                sample_ids = np.random.randint(len(examples), size=args.batch_size)
-                boards, pis, vs = list(zip(*[examples[i] for i in sample_ids]))
-                boards = torch.FloatTensor(np.array(boards).astype(np.float64))
-                target_pis = torch.FloatTensor(np.array(pis))
-                target_vs = torch.FloatTensor(np.array(vs).astype(np.float64))
-
-                # predict
-                if args.cuda:
-                    boards, target_pis, target_vs = boards.contiguous().cuda(), target_pis.contiguous().cuda(), \
-                                                    target_vs.contiguous().cuda()
-
-                # compute output
-                out_pi, out_v = self.nnet(boards)
-                l_pi = self.loss_pi(target_pis, out_pi)
-                l_v = self.loss_v(target_vs, out_v)
+            batch_count = int(len(all_boards) / args.batch_size)
+            permutation = torch.randperm(len(all_boards), generator=generator).to(all_boards.device)
+
+            t = tqdm(range(batch_count), desc='Training Net', disable=rank != 0)
+            for batch in t:
+                first = batch * args.batch_size + rank * batch_size
+                sample_ids = permutation[first:first + batch_size]
+                boards, target_pis, target_vs = all_boards[sample_ids], all_pis[sample_ids], all_vs[sample_ids]
+
+                # compute output (losses in float32, also under bf16 autocast)
+                with autocast():
+                    out_pi, out_v = model(boards)
+                out_pi, out_v = out_pi.float(), out_v.float()
+                l_pi = NNetWrapper.loss_pi(target_pis, out_pi)
+                l_v = NNetWrapper.loss_v(target_vs, out_v)
                 total_loss = l_pi + l_v
 
                 # record loss
@@ -84,39 +174,227 @@ class NNetWrapper(NeuralNet):
                 optimizer.zero_grad()
                 total_loss.backward()
                 optimizer.step()
-            self.epoch_count += 1
+            losses.append((pi_losses.avg, v_losses.avg))
+        return losses
 
-            finish = time.time()
+    def train_distributed(self, tensors, seed):
+        """
+        train_epochs in args.train_workers processes on this machine (DistributedDataParallel, gloo backend).
+        The example tensors and a copy of the network are placed in shared memory; every worker trains a replica
+        on its share of each batch (gradients are averaged), and worker 0 writes the trained weights back, so the
+        result is one network, saved by save_checkpoint as usual. Returns the losses of worker 0's shards.
+        Each batch is split evenly, so args.batch_size must be a multiple of args.train_workers.
+        """
+        assert args.batch_size % args.train_workers == 0, \
+            'batch_size {} is not a multiple of train_workers {}'.format(args.batch_size, args.train_workers)
+        model = onnet.OthelloNNet(self.game, self.net_args)
+        model.load_state_dict(self.nnet.state_dict())
+        model.share_memory()
+        tensors = [tensor.share_memory_() for tensor in tensors]
+        losses = torch.zeros(args.epochs, 2).share_memory_()
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            port = s.getsockname()[1]
 
-            # Write losses to tensorboard:
-            self.writer.add_scalar("Loss - Training (Pi): ", pi_losses.avg, self.epoch_count)
-            self.writer.add_scalar("Loss - Training (V): ", v_losses.avg, self.epoch_count)
-            self.writer.add_scalar("Total Loss:", pi_losses.avg+v_losses.avg, self.epoch_count)
-        self.writer.add_scalar("Training time (per epoch): ", finish-start)
+        mp.spawn(_train_worker, nprocs=args.train_workers,
+                 args=(args.train_workers, port, seed, self.game.n, model, tensors, losses, dict(args)))
+        self.nnet.load_state_dict(model.state_dict())
+        return losses.tolist()
+
+    @staticmethod
+    def examples_to_tensors(examples):
+        """
+        examples: list of examples (board, pi, v)
+        returns the boards, policies and values as contiguous float32 tensors on the training device
+        """
+        boards = torch.from_numpy(np.array([example[0] for example in examples], dtype=np.float32))
+        pis = torch.from_numpy(np.array([example[1] for example in examples], dtype=np.float32))
+        vs = torch.from_numpy(np.array([example[2] for example in examples], dtype=np.float32))
+        if args.cuda:
+            boards, pis, vs = boards.cuda(), pis.cuda(), vs.cuda()
+        return boards, pis, vs
+
+    def distill(self, teacher, examples):
+        """
+        Trains this network (the student) on examples (board, pi, v) whose targets are blended with the outputs
+        of teacher, a larger trained network: pi and v become distill_alpha * target + (1 - distill_alpha) *
+        teacher output. Blending the targets gives the gradients of the blend of the losses against the game
+        targets and against the teacher (cross-entropy is linear in the target, squared errors differ by a
+        constant), so this is train on soft targets.
+        """
+        boards = np.array([example[0] for example in examples])
+        teacher_pis, teacher_vs = zip(*[teacher.forward(boards[start:start + args.batch_size])
+                                        for start in range(0, len(boards), args.batch_size)])
+        teacher_pis, teacher_vs = np.concatenate(teacher_pis), np.concatenate(teacher_vs)
+
+        alpha = args.distill_alpha
+        self.train([(board, alpha * np.asarray(pi) + (1 - alpha) * teacher_pi, alpha * v + (1 - alpha) * teacher_v)
+                    for (board, pi, v), teacher_pi, teacher_v in zip(examples, teacher_pis, teacher_vs)])
+
+    def snapshot(self):
+        """
+        In-memory copy of the weights (state dict and architecture args) that restore puts back; unlike a
+        checkpoint it involves no file and no serialization.
+        """
+        return {'state_dict': {name: tensor.clone() for name, tensor in self.nnet.state_dict().items()},
+                'net_args': {key: self.net_args[key] for key in ARCHITECTURE_ARGS}}
+
+    def restore(self, snapshot, assign=False):
+        """
+        Loads the weights of snapshot (or of a checkpoint, which has the same keys). With assign the network
+        takes the tensors of snapshot as its weights instead of copying them (e.g. the memory-mapped views of a
+        mapped checkpoint); nothing else may use them afterwards.
+        """
+        architecture = snapshot.get('net_args', {})
+        if self.shares_weights or any(self.net_args[key] != value for key, value in architecture.items()):
+            # another wrapper's module, or e.g. a distilled student checkpoint: a network of its own
+            # (without initial weights when they are all replaced by assign).
+            self.net_args = dotdict({**self.net_args, **architecture})
+            with torch.device('meta') if assign else contextlib.nullcontext():
+                self.nnet = onnet.OthelloNNet(self.game, self.net_args)
+            if args.cuda and not assign:
+                self.nnet.cuda()
+            self.shares_weights = False
+        self.nnet.load_state_dict(snapshot['state_dict'], assign=assign)
+        self.weights_changed()
+
+    def share_weights(self, other):
+        """
+        Makes this network use the weights of the NNetWrapper other without copying them: both hold the same
+        module until one of them changes its weights (train, restore, load_checkpoint), which first gives that
+        one a private copy (unshare_weights). Both wrappers are marked, since either may change first: the
+        Coaches train other (nnet) while self (pnet) keeps the previous weights.
+        """
+        self.nnet = other.nnet
+        self.net_args = other.net_args
+        self.shares_weights = other.shares_weights = True
+        self.weights_changed()
+
+    def unshare_weights(self):
+        """
+        Copy-on-write of share_weights: replaces a module that may be shared by a private copy of its weights.
+        """
+        if self.shares_weights:
+            self.nnet = copy.deepcopy(self.nnet)
+            self.shares_weights = False
+
+    def weights_changed(self):
+        """
+        Called whenever the weights change: bumps the version and drops the cached evaluations of the old weights.
+        """
+        self.version += 1
+        if self.cache is not None:
+            self.cache.clear()
 
     def predict(self, board):
         """
         board: np array with board
         """
         # timing
-        start = time.time()
+        start = time.perf_counter() if self.metrics.enabled else None
+
+        pis, vs = self.predict_batch(board[np.newaxis], timed=False)  # timed here only, as one predict.
+
+        if start is not None:
+            self.metrics.record('Inference/predict', time.perf_counter() - start)
+        return pis[0], vs[:1]  # v keeps the (1,) shape predict has always returned.
 
-        # preparing input
-        board = torch.FloatTensor(board.astype(np.float64))
+    def predict_batch(self, boards, timed=True):
+        """
+        boards: (B, board_x, board_y) np array of boards
+        returns (B, action_size) policies and (B,) values
+        timed=False leaves the latency to the caller (predict), so a call is recorded once.
+        With args.eval_cache_bytes, symmetric transpositions (also of other MCTS trees, RHEA individuals or
+        generations) share one evaluation of the cache.
+        """
+        boards = np.reshape(boards, (-1, self.board_x, self.board_y))
+        if self.cache is None:
+            return self.forward(boards, timed)
+
+        pis, vs, missed = self.cache.evaluate(self.game, boards, lambda misses: self.forward(misses, timed))
+        if self.metrics.enabled:
+            self.metrics.count('Inference/cache_hits', len(boards) - missed)
+            self.metrics.count('Inference/cache_misses', missed)
+        return pis, vs
+
+    def forward(self, boards, timed=True):
+        """
+        boards: (B, board_x, board_y) np array of boards
+        Evaluates every board with one forward pass of the network (no cache); timed=False counts it without
+        recording its latency.
+        """
+        start = time.perf_counter() if self.metrics.enabled else None
+        size = len(boards)
+
+        # preparing input: boards are copied (and converted) into the preallocated buffer of this thread, so
+        # threads predicting with the same wrapper never write to each other's inputs.
+        buffer = getattr(self.buffers, 'inputs', None)
+        if buffer is None or len(buffer) < size:
+            capacity = max(size, 2 * len(buffer) if buffer is not None else args.batch_size)
+            buffer = self.buffers.inputs = torch.empty((capacity, self.board_x, self.board_y), dtype=torch.float32,
+                                                       pin_memory=args.cuda)  # pinned memory only exists with CUDA.
+        inputs = buffer[:size]
+        np.copyto(inputs.numpy(), boards)
         if args.cuda:
-            board = board.contiguous().cuda()
-        board = board.view(1, self.board_x, self.board_y)
-        self.nnet.eval()
-        with torch.no_grad():
-            pi, v = self.nnet(board)
+            inputs = inputs.cuda(non_blocking=True)
+
+        module = self.inference_module()
+        with torch.inference_mode(), autocast(enabled=module is not self.quantized):  # INT8 ops take no bf16.
+            pi, v = module(inputs)
+        pis, vs = torch.exp(pi.float()).cpu().numpy(), v.float().cpu().numpy().reshape(-1)
+
+        if start is not None:
+            self.metrics.count('Inference/forward_passes')
+            self.metrics.count('Inference/forward_boards', size)
+            if timed:
+                self.metrics.record('Inference/forward', time.perf_counter() - start)
+        return pis, vs
 
-        self.writer.add_scalar("Inference time (per epoch): ", time.time()-start)
-        return torch.exp(pi).data.cpu().numpy()[0], v.data.cpu().numpy()[0]
+    def calibrate(self, boards):
+        """
+        boards: representative boards (e.g. stored training examples) observed to calibrate the static
+        quantization of the conv stack; train keeps a sample of its examples when quantized_inference is set.
+        """
+        self.calibration_boards = torch.from_numpy(np.array(boards, dtype=np.float32))
+        self.quantized_version = -1
 
-    def loss_pi(self, targets, outputs):
+    def inference_module(self):
+        """
+        Module used by forward: with quantized_inference (CPU only, once calibration boards are known) the INT8
+        copy of the current weights, otherwise the frozen copy, both rebuilt after the weights change; without
+        frozen_inference the eager network in eval mode. Training always uses the eager network.
+        """
+        if args.quantized_inference and not args.cuda and self.calibration_boards is not None:
+            if self.quantized_version != self.version:
+                self.quantized = onnet.quantize(self.nnet, self.calibration_boards)
+                self.quantized_version = self.version
+            return self.quantized
+        if not args.frozen_inference:
+            if self.nnet.training:
+                self.nnet.eval()
+            return self.nnet
+        if self.frozen_version != self.version:
+            self.frozen = onnet.freeze(self.nnet)
+            self.frozen_version = self.version
+        return self.frozen
+
+    def flush_metrics(self):
+        """
+        Writes the inference metrics aggregated since the last flush (counters, latency quantiles, cache hit rate),
+        at the number of timed inference calls so far, the step of the automatic flushes as well.
+        """
+        counters = self.metrics.counters
+        lookups = counters['Inference/cache_hits'] + counters['Inference/cache_misses']
+        if lookups:
+            counters['Inference/cache_hit_rate'] = counters['Inference/cache_hits'] / lookups
+        self.metrics.flush()
+
+    @staticmethod
+    def loss_pi(targets, outputs):
         return -torch.sum(targets * outputs) / targets.size()[0]
 
-    def loss_v(self, targets, outputs):
+    @staticmethod
+    def loss_v(targets, outputs):
         return torch.sum((targets - outputs.view(-1)) ** 2) / targets.size()[0]
 
     def save_checkpoint(self, folder='checkpoint', filename='checkpoint.pth.tar'):
@@ -126,15 +404,66 @@ class NNetWrapper(NeuralNet):
             os.mkdir(folder)
         else:
             print("Checkpoint Directory exists! ")
-        torch.save({
-            'state_dict': self.nnet.state_dict(),
-        }, filepath)
+        net_args = {key: self.net_args[key] for key in ARCHITECTURE_ARGS}
+        if args.mapped_checkpoints:
+            MappedCheckpoint.save(filepath, self.nnet.state_dict(), net_args)
+        else:
+            torch.save({'state_dict': self.nnet.state_dict(), 'net_args': net_args}, filepath)
 
     def load_checkpoint(self, folder='checkpoint', filename='checkpoint.pth.tar'):
         # https://github.com/pytorch/examples/blob/master/imagenet/main.py#L98
         filepath = os.path.join(folder, filename)
         if not os.path.exists(filepath):
             raise ("No model in path {}".format(filepath))
-        map_location = None if args.cuda else 'cpu'
-        checkpoint = torch.load(filepath, map_location=map_location)
-        self.nnet.load_state_dict(checkpoint['state_dict'])
+        if MappedCheckpoint.is_mapped(filepath):
+            # zero-copy on CPU: the weights are views of the (copy-on-write) mapping of the file.
+            checkpoint = MappedCheckpoint.load(filepath)
+            if args.cuda:
+                checkpoint['state_dict'] = {name: tensor.cuda() for name, tensor in checkpoint['state_dict'].items()}
+            self.restore(checkpoint, assign=True)
+        else:
+            map_location = None if args.cuda else 'cpu'
+            self.restore(torch.load(filepath, map_location=map_location), assign=True)  # tensors of no one else.
+
+
+def _train_worker(rank, world_size, port, seed, n, model, tensors, losses, parent_args):
+    """
+    Process rank of NNetWrapper.train_distributed. The game is passed as its board size n (spawn pickles the
+    arguments, and a game would carry the process-wide transposition table along).
+    """
+    args.update(parent_args)
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // world_size))
+    dist.init_process_group('gloo', init_method='tcp://127.0.0.1:{}'.format(port), rank=rank, world_size=world_size)
+    try:
+        game = OthelloGame(n, use_table=False)
+        replica = onnet.OthelloNNet(game, model.args)  # private weights; the shared model only receives the result.
+        replica.load_state_dict(model.state_dict())
+        # Each replica keeps the BatchNorm running statistics of its own shards (no broadcast of rank 0's
+        # buffers), and they are averaged before rank 0 writes the result back.
+        epoch_losses = NNetWrapper.train_epochs(DistributedDataParallel(replica, broadcast_buffers=False), *tensors,
+                                                seed=seed, rank=rank, world_size=world_size)
+        _average_batch_norm_statistics(replica, world_size)
+        if rank == 0:
+            with torch.no_grad():
+                shared = model.state_dict()
+                for name, value in replica.state_dict().items():
+                    shared[name].copy_(value)
+                losses.copy_(torch.tensor(epoch_losses))
+    finally:
+        dist.destroy_process_group()
+
+
+def _average_batch_norm_statistics(model, world_size):
+    """
+    All-reduces the running mean and variance of every BatchNorm of the replica model over the world_size
+    training processes and divides them by world_size. SyncBatchNorm would synchronize the batch statistics
+    instead, but it only runs on GPU modules, and train_distributed trains on CPU. All shards are equal splits
+    of the same batches, so the average of the running means is the running mean of the whole batches; the
+    average of the (unbiased) shard variances estimates their variance.
+    """
+    with torch.no_grad():
+        for module in model.modules():
+            if isinstance(module, torch.nn.modules.batchnorm._BatchNorm) and module.track_running_stats:
+                for statistic in [module.running_mean, module.running_var]:
+                    dist.all_reduce(statistic)
+                    statistic.div_(world_size)
@@ -1,6 +1,11 @@
+import warnings
+
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
+from torch.ao.quantization import DeQuantStub, QuantStub, convert, fuse_modules, get_default_qconfig, prepare, \
+    quantize_dynamic
+from torch.nn.utils.fusion import fuse_conv_bn_eval, fuse_linear_bn_eval
 
 
 class OthelloNNet(nn.Module):
@@ -21,15 +26,18 @@ class OthelloNNet(nn.Module):
         self.bn3 = nn.BatchNorm2d(args.num_channels)
         self.bn4 = nn.BatchNorm2d(args.num_channels)
 
-        self.fc1 = nn.Linear(args.num_channels*(self.board_x-4)*(self.board_y-4), 1024)
-        self.fc_bn1 = nn.BatchNorm1d(1024)
+        # Widths of the FC stack (configurable, e.g. for a small distilled student network).
+        fc1_size, fc2_size = args.get('fc1_size', 1024), args.get('fc2_size', 512)
+
+        self.fc1 = nn.Linear(args.num_channels*(self.board_x-4)*(self.board_y-4), fc1_size)
+        self.fc_bn1 = nn.BatchNorm1d(fc1_size)
 
-        self.fc2 = nn.Linear(1024, 512)
-        self.fc_bn2 = nn.BatchNorm1d(512)
+        self.fc2 = nn.Linear(fc1_size, fc2_size)
+        self.fc_bn2 = nn.BatchNorm1d(fc2_size)
 
-        self.fc3 = nn.Linear(512, self.action_size)
+        self.fc3 = nn.Linear(fc2_size, self.action_size)
 
-        self.fc4 = nn.Linear(512, 1)
+        self.fc4 = nn.Linear(fc2_size, 1)
 
     def forward(self, s):
         #                                                           s: batch_size x board_x x board_y
@@ -40,10 +48,131 @@ class OthelloNNet(nn.Module):
         s = F.relu(self.bn4(self.conv4(s)))                          # batch_size x num_channels x (board_x-4) x (board_y-4)
         s = s.view(-1, self.args.num_channels*(self.board_x-4)*(self.board_y-4))
 
-        s = F.dropout(F.relu(self.fc_bn1(self.fc1(s))), p=self.args.dropout, training=self.training)  # batch_size x 1024
-        s = F.dropout(F.relu(self.fc_bn2(self.fc2(s))), p=self.args.dropout, training=self.training)  # batch_size x 512
+        s = F.dropout(F.relu(self.fc_bn1(self.fc1(s))), p=self.args.dropout, training=self.training)  # batch_size x fc1_size
+        s = F.dropout(F.relu(self.fc_bn2(self.fc2(s))), p=self.args.dropout, training=self.training)  # batch_size x fc2_size
 
         pi = self.fc3(s)                                                                         # batch_size x action_size
         v = self.fc4(s)                                                                          # batch_size x 1
 
         return F.log_softmax(pi, dim=1), torch.tanh(v)
+
+
+class FusedOthelloNNet(nn.Module):
+    """
+    Inference-only copy of an OthelloNNet: every BatchNorm is folded (with its running statistics) into the
+    weights of the conv/linear layer before it and dropout is dropped, so forward is 6 conv/linear layers and
+    the heads. Outputs match the eval() mode of the source network.
+    """
+
+    def __init__(self, nnet):
+        super(FusedOthelloNNet, self).__init__()
+        self.board_x, self.board_y = nnet.board_x, nnet.board_y
+        self.flat_size = nnet.fc1.in_features
+
+        self.conv1 = fuse_conv_bn_eval(nnet.conv1, nnet.bn1)
+        self.conv2 = fuse_conv_bn_eval(nnet.conv2, nnet.bn2)
+        self.conv3 = fuse_conv_bn_eval(nnet.conv3, nnet.bn3)
+        self.conv4 = fuse_conv_bn_eval(nnet.conv4, nnet.bn4)
+
+        self.fc1 = fuse_linear_bn_eval(nnet.fc1, nnet.fc_bn1)
+        self.fc2 = fuse_linear_bn_eval(nnet.fc2, nnet.fc_bn2)
+        self.fc3 = nn.Linear(nnet.fc3.in_features, nnet.fc3.out_features)
+        self.fc4 = nn.Linear(nnet.fc4.in_features, nnet.fc4.out_features)
+        self.fc3.load_state_dict(nnet.fc3.state_dict())
+        self.fc4.load_state_dict(nnet.fc4.state_dict())
+
+    def forward(self, s):
+        s = s.view(-1, 1, self.board_x, self.board_y)
+        s = F.relu(self.conv1(s))
+        s = F.relu(self.conv2(s))
+        s = F.relu(self.conv3(s))
+        s = F.relu(self.conv4(s))
+        s = s.view(-1, self.flat_size)
+
+        s = F.relu(self.fc1(s))
+        s = F.relu(self.fc2(s))
+
+        pi = self.fc3(s)
+        v = self.fc4(s)
+
+        return F.log_softmax(pi, dim=1), torch.tanh(v)
+
+
+def freeze(nnet):
+    """
+    Frozen TorchScript inference module of the OthelloNNet nnet: BatchNorm is folded into the conv/linear
+    weights (FusedOthelloNNet), then the module is scripted and frozen, which turns the weights into constants
+    of the graph. The module is a snapshot; freeze again after the weights of nnet change.
+
+    TorchScript is current in the pinned PyTorch (1.9, requirements.yml); releases that deprecate
+    torch.jit.script/torch.jit.freeze (2.x, FutureWarning) get the eager fused module instead, which keeps
+    the BatchNorm folding but not the graph freezing.
+    """
+    training = nnet.training
+    nnet.eval()  # BatchNorm is folded with its running statistics.
+    with torch.no_grad():
+        fused = FusedOthelloNNet(nnet).eval()
+    nnet.train(training)
+    for parameter in fused.parameters():
+        parameter.requires_grad_(False)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', FutureWarning)  # raised by the deprecation notice, before any scripting.
+            return torch.jit.freeze(torch.jit.script(fused))
+    except FutureWarning:
+        return fused
+
+
+class QuantizableOthelloNNet(FusedOthelloNNet):
+    """
+    FusedOthelloNNet with quantization stubs around the conv stack and separate ReLU modules, so that
+    quantize can convert conv+ReLU pairs to static INT8 modules and the Linear layers to dynamic INT8 ones.
+    """
+
+    def __init__(self, nnet):
+        super(QuantizableOthelloNNet, self).__init__(nnet)
+        self.quant = QuantStub()
+        self.dequant = DeQuantStub()
+        self.relu1, self.relu2, self.relu3, self.relu4 = nn.ReLU(), nn.ReLU(), nn.ReLU(), nn.ReLU()
+
+    def forward(self, s):
+        s = self.quant(s.view(-1, 1, self.board_x, self.board_y))
+        s = self.relu1(self.conv1(s))
+        s = self.relu2(self.conv2(s))
+        s = self.relu3(self.conv3(s))
+        s = self.relu4(self.conv4(s))
+        s = self.dequant(s).reshape(-1, self.flat_size)
+
+        s = F.relu(self.fc1(s))
+        s = F.relu(self.fc2(s))
+
+        pi = self.fc3(s)
+        v = self.fc4(s)
+
+        return F.log_softmax(pi, dim=1), torch.tanh(v)
+
+
+def quantize(nnet, calibration_boards, batch_size=64):
+    """
+    INT8 CPU inference module of the OthelloNNet nnet. The conv stack (BatchNorm folded, fused with its ReLU)
+    is quantized statically: activation ranges are observed on calibration_boards, a (B, board_x, board_y)
+    float tensor of representative positions such as stored training examples. The Linear layers are quantized
+    dynamically (INT8 weights, activation scales computed per batch). Like freeze, the result is a snapshot.
+    """
+    training = nnet.training
+    nnet.eval()
+    with torch.no_grad():
+        model = QuantizableOthelloNNet(nnet).eval()
+    nnet.train(training)
+
+    fuse_modules(model, [['conv1', 'relu1'], ['conv2', 'relu2'], ['conv3', 'relu3'], ['conv4', 'relu4']],
+                 inplace=True)
+    model.qconfig = get_default_qconfig(torch.backends.quantized.engine)
+    for fc in [model.fc1, model.fc2, model.fc3, model.fc4]:
+        fc.qconfig = None  # left to quantize_dynamic
+    prepare(model, inplace=True)
+    with torch.no_grad():
+        for start in range(0, len(calibration_boards), batch_size):
+            model(calibration_boards[start:start + batch_size])
+    convert(model, inplace=True)
+    return quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
@@ -0,0 +1,76 @@
+import logging
+import os
+import time
+from pickle import Unpickler
+
+import coloredlogs
+import numpy as np
+from torch.utils.tensorboard import SummaryWriter
+
+from othello.OthelloGame import OthelloGame
+from othello.pytorch.NNet import NNetWrapper
+
+"""
+Distills the trained RHEA network (teacher) into a small student network used by RHEAPopulation for fitness
+evaluation (fitness_nnet), while the teacher still picks the executed moves. The student is trained on the
+stored self-play examples blended with the teacher's outputs (NNetWrapper.distill) and saved next to the
+teacher. Reports the latency of both networks and how often they agree on held-out examples.
+"""
+
+
+def agreement(teacher, student, boards):
+    """ Fractions of boards on which policy argmax and value sign of teacher and student agree. """
+    teacher_pis, teacher_vs = teacher.forward(boards)
+    student_pis, student_vs = student.forward(boards)
+    return np.mean(teacher_pis.argmax(axis=1) == student_pis.argmax(axis=1)), \
+        np.mean(np.sign(teacher_vs) == np.sign(student_vs))
+
+
+def latency(nnet, boards, repeats=20):
+    """ Mean seconds per forward pass of boards. """
+    nnet.forward(boards)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        nnet.forward(boards)
+    return (time.perf_counter() - start) / repeats
+
+
+def main():
+    CHK_DIR = "C:/Users/heerd/PycharmProjects/DeepRHEA/run/best_models"
+    TEACHER = 'rhea.pth.tar'
+    EXAMPLES = 'checkpoint_49.pth.tar.examples'  # trainExamplesHistory saved by deep_rhea.Coach
+    STUDENT = 'rhea_student.pth.tar'
+    STUDENT_ARCHITECTURE = {'num_channels': 64, 'fc1_size': 256, 'fc2_size': 128}
+    HELD_OUT = 0.1  # Fraction of the examples kept aside to measure agreement.
+
+    log = logging.getLogger(__name__)
+    coloredlogs.install(level='INFO')
+
+    game = OthelloGame(n=6)
+    writer = SummaryWriter(comment="Distillation")
+    teacher = NNetWrapper(game, writer, empty=True)
+    teacher.load_checkpoint(CHK_DIR, TEACHER)
+    student = NNetWrapper(game, writer, net_args=STUDENT_ARCHITECTURE)
+
+    with open(os.path.join(CHK_DIR, EXAMPLES), "rb") as f:
+        examples = [example for iteration in Unpickler(f).load() for example in iteration]
+    np.random.shuffle(examples)
+    split = int(len(examples) * HELD_OUT)
+    held_out, examples = examples[:split], examples[split:]
+    log.info('Distilling on %d examples, %d held out.', len(examples), len(held_out))
+
+    student.distill(teacher, examples)
+    student.save_checkpoint(folder=CHK_DIR, filename=STUDENT)
+
+    boards = np.array([example[0] for example in held_out])
+    policy_agreement, value_agreement = agreement(teacher, student, boards)
+    log.info('Held-out agreement: policy argmax %.1f%%, value sign %.1f%%', 100 * policy_agreement,
+             100 * value_agreement)
+    for size in [1, 64]:
+        t_teacher, t_student = latency(teacher, boards[:size]), latency(student, boards[:size])
+        log.info('Batch %d: teacher %.2f ms, student %.2f ms (%.1fx)', size, t_teacher * 1e3, t_student * 1e3,
+                 t_teacher / t_student)
+
+
+if __name__ == "__main__":
+    main()
@@ -38,7 +38,7 @@ hp = HumanOthelloPlayer(g).play
 checkpoint_dir = r'C:\Users\heerd\PycharmProjects\DeepRHEA\run\best_models'
 writer = SummaryWriter(log_dir='pit', comment='mcts_run1')
 # nnet players
-n1 = NNet(g, writer)
+n1 = NNet(g, writer, empty=True)  # weights come from the checkpoint
 if mini_othello:
     n1.load_checkpoint(checkpoint_dir, 'mcts.pth.tar')
 else:
@@ -54,7 +54,7 @@ elif random_vs_cpu:
 elif greedy_vs_cpu:
     player2 = gp
 else:
-    n2 = NNet(g, writer)
+    n2 = NNet(g, writer, empty=True)
     n2.load_checkpoint(checkpoint_dir, 'mcts.pth.tar')
     args2 = dotdict({'numMCTSSims': 20, 'cpuct': 1.0})
     mcts2 = MCTS(g, n2, args2)
@@ -3,6 +3,7 @@ from torch.utils.tensorboard import SummaryWriter
 from alpha_zero.MCTS import MCTS
 from core_game.utils import dotdict
 from deep_rhea.Arena import Arena
+from deep_rhea.RHEAArrayPopulation import RHEAArrayPopulation
 from deep_rhea.RHEAPopulation import RHEAPopulation
 from othello.OthelloGame import OthelloGame
 from othello.OthelloLogic import Board
@@ -22,6 +23,13 @@ random_vs_cpu = False
 greedy_vs_cpu = False
 rhea_vs_rhea = False
 
+# RHEA measures fitness with the distilled student (run/distill_othello_student.py); the network still picks
+# the executed moves.
+use_student = False
+
+# RHEA keeps its population in arrays (RHEAArrayPopulation), practical for hundreds of individuals.
+array_population = False
+
 print('VS HUMAN: ', human_vs_cpu)
 print('VS random: ', random_vs_cpu)
 print('VS greedy: ', greedy_vs_cpu)
@@ -42,7 +50,7 @@ checkpoint_dir = r'C:\Users\heerd\PycharmProjects\DeepRHEA\run\best_models'
 writer = SummaryWriter(log_dir='pit', comment='rhea_run1')
 
 # nnet players
-n1 = NNet(g, writer=writer)
+n1 = NNet(g, writer=writer, empty=True)  # weights come from the checkpoint
 if mini_othello:
     n1.load_checkpoint(checkpoint_dir, 'rhea.pth.tar')
 else:
@@ -54,10 +62,18 @@ args1 = dotdict({'NUM_OF_INDIVIDUALS': 15,
                      'MAX_GENERATION_BUDGET': 25,
                      'MUTATION_CHANCE': 0.7,  # Number of complete self-play games to simulate during a new iteration.
                      'CROSSOVER_MUTATIONS': 3,  # must be less than number of individuals.
+                     'TIME_BUDGET': None,  # seconds per move; evolve stops early when they run out.
+                     'EVALUATION_BUDGET': None,  # positions evaluated per move (forward-pass rows).
                      })
 # mcts1 = MCTS(g, n1, args1)
 
-rhea = RHEAPopulation(game=g, nnet=n1, args=args1, board=Board(6))
+fitness_net = None
+if use_student:
+    fitness_net = NNet(g, writer=writer, empty=True)
+    fitness_net.load_checkpoint(checkpoint_dir, 'rhea_student.pth.tar')
+
+population = RHEAArrayPopulation if array_population else RHEAPopulation
+rhea = population(game=g, nnet=n1, args=args1, board=Board(6), fitness_nnet=fitness_net)
 action1 = rhea.evolve()
 
 if human_vs_cpu:
@@ -67,7 +83,7 @@ elif random_vs_cpu:
 elif greedy_vs_cpu:
     player2 = gp
 elif rhea_vs_rhea:
-    n2 = NNet(g, writer)
+    n2 = NNet(g, writer, empty=True)
     n2.load_checkpoint(checkpoint_dir, 'rhea.pth.tar')
     args2 = dotdict({'NUM_OF_INDIVIDUALS': 20,
                      'INDIVIDUAL_LENGTH': 5,
@@ -78,7 +94,7 @@ elif rhea_vs_rhea:
                      })
     player2 = RHEAPopulation(game=g, nnet=n2, args=args2, player=-1, board=Board(6))
 else:
-    n2 = NNet(g, writer)
+    n2 = NNet(g, writer, empty=True)
     n2.load_checkpoint(checkpoint_dir, 'mcts.pth.tar')
     args2 = dotdict({'numMCTSSims': 20, 'cpuct': 1.0})
     mcts2 = MCTS(g, n2, args2)
@@ -0,0 +1,62 @@
+import threading
+
+import numpy as np
+import torch
+from torch.utils.tensorboard import SummaryWriter
+
+from core_game.InferenceServer import InferenceServer
+from othello.OthelloGame import OthelloGame
+from othello.pytorch import NNet
+
+# Several threads predict through one InferenceServer: every caller must get the evaluation of its own board
+# (the same as a direct predict_batch), the requests must be coalesced into batches, and a closed server must
+# refuse new requests instead of blocking them forever.
+THREADS = 8
+BOARDS_PER_THREAD = 50
+
+torch.manual_seed(0)
+game = OthelloGame(n=6)
+NNet.args.cuda = False
+nnet = NNet.NNetWrapper(game, SummaryWriter(comment='InferenceServerTest'))
+
+rng = np.random.default_rng(0)
+boards = rng.integers(-1, 2, size=(THREADS, BOARDS_PER_THREAD, 6, 6)).astype(np.float64)
+expected_pis, expected_vs = nnet.predict_batch(boards.reshape(-1, 6, 6))
+expected_pis = expected_pis.reshape(THREADS, BOARDS_PER_THREAD, -1)
+expected_vs = expected_vs.reshape(THREADS, BOARDS_PER_THREAD)
+
+server = InferenceServer(nnet, max_batch_size=THREADS, max_wait_us=2000)
+errors = []
+
+
+def search(k):
+    for i in range(BOARDS_PER_THREAD):
+        pi, v = server.predict(boards[k, i])
+        if not (np.allclose(pi, expected_pis[k, i], atol=1e-5) and np.allclose(v, expected_vs[k, i], atol=1e-5)):
+            errors.append((k, i))
+
+
+threads = [threading.Thread(target=search, args=(k,)) for k in range(THREADS)]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+
+stats = server.stats()
+print(stats)
+assert not errors, 'wrong evaluations for {} requests'.format(len(errors))
+assert stats['requests'] == THREADS * BOARDS_PER_THREAD
+assert stats['mean_batch_size'] > 1
+
+server.close()
+try:
+    server.predict(boards[0, 0])
+    raise AssertionError('predict on a closed server did not raise')
+except RuntimeError:
+    pass
+
+server.start()
+pi, v = server.predict(boards[0, 0])
+assert np.allclose(pi, expected_pis[0, 0], atol=1e-5)
+server.close()
+print('InferenceServer OK')
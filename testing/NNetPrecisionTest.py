@@ -0,0 +1,58 @@
+import time
+
+import numpy as np
+import torch
+from torch.utils.tensorboard import SummaryWriter
+
+from othello.OthelloGame import OthelloGame
+from othello.pytorch import NNet
+
+# Trains the same initial network on the same examples in fp32 and under bf16 autocast (args.precision) and
+# reports the training throughput and the loss of the last epoch, then the predict_batch throughput of the
+# fp32-trained network in both precisions and how often bf16 picks the same move (policy argmax) as fp32.
+# bf16 pays off on CPUs with native bf16 instructions (AVX512-BF16 / AMX); elsewhere it is emulated.
+EXAMPLES = 64 * 16
+EPOCHS = 3
+BATCH_SIZE = 64
+REPEATS = 20
+
+game = OthelloGame(n=6)
+NNet.args.cuda = False
+NNet.args.epochs = EPOCHS
+NNet.args.eval_cache_bytes = 0  # every predict_batch is a forward pass.
+writer = SummaryWriter(comment='PrecisionTest')
+
+rng = np.random.default_rng(0)
+examples = [(rng.integers(-1, 2, size=(6, 6)), rng.dirichlet(np.ones(game.getActionSize())), rng.uniform(-1, 1))
+            for _ in range(EXAMPLES)]
+tensors = NNet.NNetWrapper.examples_to_tensors(examples)
+boards = np.stack([example[0] for example in examples[:BATCH_SIZE]])
+
+nnets = {}
+for precision in ['fp32', 'bf16']:
+    NNet.args.precision = precision
+    torch.manual_seed(0)
+    nnet = nnets[precision] = NNet.NNetWrapper(game, writer)
+
+    start = time.perf_counter()
+    losses = nnet.train_epochs(nnet.nnet, *tensors, seed=0)
+    rate = EPOCHS * EXAMPLES / (time.perf_counter() - start)
+    nnet.weights_changed()
+    print('{} training: {:.0f} examples/s, final loss pi {:.4f} v {:.4f}'.format(precision, rate, *losses[-1]))
+
+# Inference of the same (fp32-trained) weights in both precisions.
+nnet = nnets['fp32']
+nnet.predict_batch(boards)  # builds the frozen module
+results = {}
+for precision in ['fp32', 'bf16']:
+    NNet.args.precision = precision
+    nnet.predict_batch(boards)  # warm-up
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        results[precision] = nnet.predict_batch(boards)
+    rate = REPEATS * BATCH_SIZE / (time.perf_counter() - start)
+    print('{} predict_batch({}): {:.0f} boards/s'.format(precision, BATCH_SIZE, rate))
+
+(pis, vs), (bf16_pis, bf16_vs) = results['fp32'], results['bf16']
+print('bf16 / fp32: policy argmax agreement {:.1%}, max |v| difference {:.4f}'.format(
+    np.mean(pis.argmax(axis=1) == bf16_pis.argmax(axis=1)), np.abs(vs - bf16_vs).max()))
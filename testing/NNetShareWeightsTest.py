@@ -0,0 +1,60 @@
+import numpy as np
+import torch
+from torch.utils.tensorboard import SummaryWriter
+
+from othello.OthelloGame import OthelloGame
+from othello.pytorch import NNet
+
+# share_weights makes two wrappers hold one module; whichever of them changes its weights first (train, restore)
+# takes a private copy, so the other keeps predicting with the weights it shared. The Coaches train the source
+# (nnet) right after the previous network (pnet) shares its weights, and share them back when they reject it.
+EXAMPLES = 128
+
+game = OthelloGame(n=6)
+NNet.args.cuda = False
+NNet.args.epochs = 1
+NNet.args.train_workers = 1
+writer = SummaryWriter(comment='ShareWeightsTest')
+
+rng = np.random.default_rng(0)
+examples = [(rng.integers(-1, 2, size=(6, 6)), rng.dirichlet(np.ones(game.getActionSize())), rng.uniform(-1, 1))
+            for _ in range(EXAMPLES)]
+boards = np.stack([example[0] for example in examples[:8]])
+
+
+def predictions(nnet):
+    pis, vs = nnet.predict_batch(boards)
+    return np.concatenate([pis, vs[:, np.newaxis]], axis=1)
+
+
+for trained in ['source', 'target']:
+    torch.manual_seed(0)
+    source, target = NNet.NNetWrapper(game, writer), NNet.NNetWrapper(game, writer)
+    target.share_weights(source)
+    assert target.nnet is source.nnet and source.shares_weights and target.shares_weights
+    before = predictions(source)
+    assert np.allclose(predictions(target), before)
+
+    changed, kept = (source, target) if trained == 'source' else (target, source)
+    changed.train(examples)
+    assert changed.nnet is not kept.nnet
+    assert not np.allclose(predictions(changed), before, atol=1e-6), 'training changed nothing'
+    assert np.allclose(predictions(kept), before, atol=1e-6), 'training the {} changed the other'.format(trained)
+
+    kept_weights = {name: tensor.clone() for name, tensor in kept.nnet.state_dict().items()}
+    changed.restore(kept.snapshot())  # restoring one side leaves the other untouched as well.
+    changed.train(examples)
+    assert all(torch.equal(kept.nnet.state_dict()[name], tensor) for name, tensor in kept_weights.items())
+    print('training the {}: the other wrapper kept its predictions'.format(trained))
+
+# The rejection path of the Coaches: the trained network takes the previous weights back and trains again.
+torch.manual_seed(0)
+nnet, pnet = NNet.NNetWrapper(game, writer), NNet.NNetWrapper(game, writer)
+pnet.share_weights(nnet)
+previous = predictions(pnet)
+nnet.train(examples)
+nnet.share_weights(pnet)
+assert np.allclose(predictions(nnet), previous, atol=1e-6)
+nnet.train(examples)
+assert np.allclose(predictions(pnet), previous, atol=1e-6)
+print('rejecting and training again: the previous network kept its predictions')
@@ -0,0 +1,46 @@
+import time
+
+import numpy as np
+import torch
+from torch.utils.tensorboard import SummaryWriter
+
+from othello.OthelloGame import OthelloGame
+from othello.pytorch import NNet
+
+# Trains the same network on the same examples with 1, 2, 4 and 8 CPU training processes
+# (NNetWrapper.train_distributed) and reports the seconds per epoch and the speedup over one process.
+# The speedup is bounded by the physical cores of the machine; workers beyond them only add overhead.
+WORKERS = [1, 2, 4, 8]
+EXAMPLES = 64 * 16
+EPOCHS = 2
+
+
+def main():
+    game = OthelloGame(n=6)
+    NNet.args.cuda = False
+    NNet.args.epochs = EPOCHS
+    writer = SummaryWriter(comment='TrainScalingTest')
+
+    rng = np.random.default_rng(0)
+    examples = [(rng.integers(-1, 2, size=(6, 6)), rng.dirichlet(np.ones(game.getActionSize())), rng.uniform(-1, 1))
+                for _ in range(EXAMPLES)]
+
+    baseline = None
+    for workers in WORKERS:
+        NNet.args.train_workers = workers
+        torch.manual_seed(0)
+        nnet = NNet.NNetWrapper(game, writer)
+        start = time.perf_counter()
+        nnet.train(examples)
+        per_epoch = (time.perf_counter() - start) / EPOCHS
+        baseline = baseline or per_epoch
+
+        # The trained weights must come back to the parent's network.
+        assert nnet.version == 1 and nnet.epoch_count == EPOCHS
+        pis, vs = nnet.predict_batch(np.stack([example[0] for example in examples[:8]]))
+        assert np.all(np.isfinite(pis)) and np.all(np.isfinite(vs))
+        print('{} worker(s): {:.2f} s/epoch, speedup {:.2f}x'.format(workers, per_epoch, baseline / per_epoch))
+
+
+if __name__ == '__main__':  # training processes are spawned and re-import this module.
+    main()
@@ -0,0 +1,99 @@
+import time
+
+import numpy as np
+import torch
+from torch.utils.tensorboard import SummaryWriter
+
+from othello.OthelloGame import OthelloGame
+from othello.pytorch import NNet
+from othello.pytorch import OthelloNNet as onnet
+
+# Compares the eager OthelloNNet with the inference modules of NNetWrapper: the frozen TorchScript module
+# (BatchNorm fused) must match it, the INT8 module is compared on held-out positions (policy argmax and value
+# sign agreement). CPU latency is reported at batch sizes 1 and 64.
+BATCH_SIZES = [1, 64]
+REPEATS = 20
+
+torch.manual_seed(0)
+game = OthelloGame(n=6)
+NNet.args.cuda = False
+nnet = NNet.NNetWrapper(game, SummaryWriter(comment='InferenceTest'))
+
+# A few training steps so that the BatchNorm running statistics are not the identity.
+rng = np.random.default_rng(0)
+examples = [(rng.integers(-1, 2, size=(6, 6)), np.full(game.getActionSize(), 1 / game.getActionSize()),
+             rng.uniform(-1, 1)) for _ in range(NNet.args.batch_size * 2)]
+epochs = NNet.args.epochs
+NNet.args.epochs = 1
+nnet.train(examples)
+NNet.args.epochs = epochs
+
+eager = nnet.nnet.eval()
+frozen = onnet.freeze(eager)
+print('torch {}: {} inference module'.format(torch.__version__, 'frozen TorchScript' if isinstance(
+    frozen, torch.jit.ScriptModule) else 'eager fused (TorchScript deprecated)'))
+
+
+def latency(model, boards):
+    """ Mean seconds per forward pass of boards. """
+    with torch.inference_mode():
+        model(boards)  # warm-up (the frozen graph is optimized on its first runs)
+        start = time.perf_counter()
+        for _ in range(REPEATS):
+            model(boards)
+    return (time.perf_counter() - start) / REPEATS
+
+
+for size in BATCH_SIZES:
+    boards = torch.from_numpy(rng.integers(-1, 2, size=(size, 6, 6)).astype(np.float32))
+    with torch.inference_mode():
+        pi_eager, v_eager = eager(boards)
+        pi_frozen, v_frozen = frozen(boards)
+    assert torch.allclose(pi_eager, pi_frozen, atol=1e-4), (pi_eager - pi_frozen).abs().max()
+    assert torch.allclose(v_eager, v_frozen, atol=1e-4), (v_eager - v_frozen).abs().max()
+
+    t_eager, t_frozen = latency(eager, boards), latency(frozen, boards)
+    print('batch {:3d}: eager {:.2f} ms, frozen {:.2f} ms ({:.2f}x), max |dpi| {:.1e}, max |dv| {:.1e}'.format(
+        size, t_eager * 1e3, t_frozen * 1e3, t_eager / t_frozen,
+        (pi_eager - pi_frozen).abs().max().item(), (v_eager - v_frozen).abs().max().item()))
+
+
+def random_positions(count):
+    """ Canonical boards of positions reached by random play (stand-in for stored training examples). """
+    positions = []
+    while len(positions) < count:
+        board, player = game.getInitBoard(), 1
+        while game.getGameEnded(board, player) == 0 and len(positions) < count:
+            positions.append(game.getCanonicalForm(board, player))
+            action = rng.choice(np.flatnonzero(game.getValidMoves(board, player)))
+            board, player = game.getNextState(board, player, action)
+    return torch.from_numpy(np.array(positions, dtype=np.float32))
+
+
+calibration, held_out = random_positions(NNet.args.calibration_size), random_positions(1024)
+quantized = onnet.quantize(eager, calibration)
+with torch.inference_mode():
+    pi_eager, v_eager = eager(held_out)
+    pi_quantized, v_quantized = quantized(held_out)
+argmax_agreement = (pi_eager.argmax(dim=1) == pi_quantized.argmax(dim=1)).float().mean().item()
+sign_agreement = (torch.sign(v_eager) == torch.sign(v_quantized)).float().mean().item()
+print('INT8 on {} held-out positions: policy argmax agreement {:.1%}, value sign agreement {:.1%}, '
+      'max |dv| {:.1e}'.format(len(held_out), argmax_agreement, sign_agreement,
+                               (v_eager - v_quantized).abs().max().item()))
+for size in BATCH_SIZES:
+    boards = held_out[:size]
+    t_eager, t_quantized = latency(eager, boards), latency(quantized, boards)
+    print('batch {:3d}: eager {:.2f} ms, INT8 {:.2f} ms ({:.2f}x)'.format(size, t_eager * 1e3, t_quantized * 1e3,
+                                                                         t_eager / t_quantized))
+
+# NNetWrapper predicts with the frozen module and rebuilds it when the weights change.
+module = nnet.inference_module()
+assert nnet.inference_module() is module
+nnet.weights_changed()
+assert nnet.inference_module() is not module
+
+# With quantized_inference it switches to the INT8 module once calibration boards are known.
+NNet.args.quantized_inference = True
+nnet.calibrate(calibration.numpy())
+assert nnet.inference_module() is not module and nnet.inference_module() is nnet.quantized
+NNet.args.quantized_inference = False
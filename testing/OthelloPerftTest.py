@@ -0,0 +1,18 @@
+from othello import OthelloPerft
+from othello.OthelloGame import OthelloGame
+
+# Depth per engine; OthelloLogic.Board is far slower, so it is checked on shallower trees.
+MAX_DEPTH = {'Board': 5, 'BitBoard': 7, 'Batch': 8}
+
+for n in [6, 8]:
+    # The transposition table is turned off so every engine generates every move itself.
+    engines = {
+        'Board': (OthelloGame(n, use_table=False), False),
+        'BitBoard': (OthelloGame(n, bitboard=True, use_table=False), False),
+        'Batch': (OthelloGame(n, use_table=False), True),
+    }
+    for name, (game, batch) in engines.items():
+        print('Engine: ', name)
+        results = OthelloPerft.run(game, MAX_DEPTH[name], batch=batch)
+        depth, nodes, seconds, nps = results[-1]
+        print('{}x{} {}: perft({}) = {} in {:.2f}s ({:.0f} nodes/s)'.format(n, n, name, depth, nodes, seconds, nps))
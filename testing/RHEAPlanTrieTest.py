@@ -0,0 +1,197 @@
+import random
+
+import numpy as np
+import torch
+from torch.utils.tensorboard import SummaryWriter
+
+from core_game.utils import dotdict
+from deep_rhea.RHEAArrayPopulation import RHEAArrayPopulation
+from deep_rhea.RHEAPopulation import RHEAPopulation
+from othello.OthelloGame import OthelloGame
+from othello.OthelloLogic import Board
+from othello.pytorch import NNet
+
+# Checks the PlanTrie of the RHEA populations against a replay of the plans on a plain board, without the trie:
+# the plans built by the network and the next actions of the shift buffer must be the greedy ones, and the
+# fitness of every individual must be the value of the position its plans reach. MUTATION_CHANCE=1.0 disables
+# the random exploration of the planned actions, so the plans are deterministic. Also checks that pruning keeps
+# the root and the paths of every plan, and that the trie is rebased onto the subtree of the moves played, also
+# when the own move and the opponent's reply are played separately (Arena).
+GENERATIONS = 4
+MOVES = 3
+
+game = OthelloGame(n=6)
+NNet.args.cuda = False
+torch.manual_seed(0)
+nnet = NNet.NNetWrapper(game, SummaryWriter(comment='PlanTrieTest'))
+
+
+class GreedyNet:
+    """ nnet with the invalid actions masked out of the policy, so its argmax is always the planned action. """
+
+    def predict(self, board):
+        pis, vs = self.predict_batch(board[np.newaxis])
+        return pis[0], vs[:1]
+
+    def predict_batch(self, boards):
+        pis, vs = nnet.predict_batch(boards)
+        return pis * np.stack([game.getValidMoves(board, 1) for board in boards]), vs
+
+
+greedy = GreedyNet()
+args = dotdict({
+    'NUM_OF_INDIVIDUALS': 20,
+    'INDIVIDUAL_LENGTH': 6,
+    'NUM_OF_BEST_INDIVIDUALS': 2,
+    'MAX_GENERATION_BUDGET': GENERATIONS,
+    'MUTATION_CHANCE': 1.0,
+    'CROSSOVER_MUTATIONS': 2,
+})
+
+
+def evaluate(board, player):
+    """ (pi, v) of board for player, without the trie (through the symmetry cache of the population). """
+    return population.evaluator.predict(game.getCanonicalForm(board.pieces, player))
+
+
+def replay(root, player, action_plan, opp_plan):
+    """ Plays the plans on a copy of root; returns the board reached. """
+    board = Board(root.n)
+    np.copyto(board.pieces, root.pieces)
+    for action, opp_action in zip(action_plan, opp_plan):
+        board.make_move((int(action) // board.n, int(action) % board.n), player)
+        board.make_move((int(opp_action) // board.n, int(opp_action) % board.n), -player)
+    return board
+
+
+def greedy_pair(board, player):
+    """ Next (action, opp_action) planned by the network on board, without the trie. """
+    action = int(np.argmax(evaluate(board, player)[0]))
+    board = replay(board, player, [action], [game.getActionSize() - 1])  # the no-op leaves the opponent to move.
+    return action, int(np.argmax(evaluate(board, -player)[0]))
+
+
+def greedy_plans(root, player):
+    """ Plans of an individual built from scratch, without the trie. """
+    action_plan, opp_plan = [], []
+    board = replay(root, player, [], [])
+    for _ in range(args.INDIVIDUAL_LENGTH):
+        if game.getGameEnded(board.pieces, player) != 0:
+            pair = (game.getActionSize() - 1, game.getActionSize() - 1)
+        else:
+            pair = greedy_pair(board, player)
+        action_plan.append(pair[0])
+        opp_plan.append(pair[1])
+        board = replay(board, player, [pair[0]], [pair[1]])
+    return action_plan, opp_plan
+
+
+def check_fitness(population):
+    """ The fitness of every individual is the value of the position its plans reach. """
+    for indv in population.individuals:
+        board = replay(population.board, population.player, indv.action_plan, indv.opp_plan)
+        _, v = evaluate(board, population.player)
+        assert np.allclose(np.ravel(indv.fitness)[0], v[0], atol=1e-5), (np.ravel(indv.fitness)[0], v[0])
+
+
+def prefix_plies(root, action_plan, opp_plan):
+    """ Number of plies of the plans already in the trie below root. """
+    node, plies = root, 0
+    for action, opp_action in zip(action_plan, opp_plan):
+        for a in (action, opp_action):
+            if a not in node.children:
+                return plies
+            node, plies = node.children[a], plies + 1
+    return plies
+
+
+def check_prune(population, root):
+    """
+    The trie is still rooted at root, and pruning it to the plans keeps the positions along them (mutated plans
+    are only simulated up to the repaired genes until their next measure).
+    """
+    assert population.trie.root is root
+    plans = [(indv.action_plan, indv.opp_plan) for indv in population.individuals]
+    before = [prefix_plies(root, *plan) for plan in plans]
+    population.trie.prune(plans)
+    assert population.trie.root is root
+    assert [prefix_plies(root, *plan) for plan in plans] == before
+
+    # Only the children along a plan are left, except below the end of a whole plan.
+    actions = {}  # id(node) -> actions of the plans at node, or None below the end of a plan
+    for action_plan, opp_plan in plans:
+        node = root
+        for a in [a for pair in zip(action_plan, opp_plan) for a in pair]:
+            if actions.get(id(node), set()) is not None:
+                actions.setdefault(id(node), set()).add(a)
+            if a not in node.children:
+                break
+            node = node.children[a]
+        else:
+            actions[id(node)] = None
+    nodes = [root]
+    while nodes:
+        node = nodes.pop()
+        if actions.get(id(node), set()) is not None:
+            assert set(node.children) <= actions.get(id(node), set()), 'a node off the plans survived pruning'
+            nodes.extend(node.children.values())
+
+
+for store in [RHEAPopulation, RHEAArrayPopulation]:
+    random.seed(0)
+    np.random.seed(0)
+    population = store(game=game, nnet=greedy, args=args, board=Board(6))
+    rebased = 0
+
+    # New individuals: every plan is the greedy one.
+    plans = greedy_plans(population.board, population.player)
+    for indv in population.individuals:
+        assert [int(a) for a in indv.action_plan] == plans[0] and [int(a) for a in indv.opp_plan] == plans[1]
+    check_fitness(population)
+
+    for move in range(MOVES):
+        root = population.trie.root
+        for _ in range(GENERATIONS):
+            population.evolve_generation()
+            check_prune(population, root)
+
+        # The shift buffer: the plans lose their first pair and end with the greedy pair of the position reached.
+        shifted = [(list(indv.action_plan[1:]), list(indv.opp_plan[1:])) for indv in population.individuals]
+        action, opp_action = population.self_play()
+        reached = root.children[action].children.get(opp_action)  # None if no plan had the opponent's move.
+        assert population.trie.root is reached or reached is None
+        assert np.array_equal(population.trie.root.board.pieces, population.board.pieces)
+        rebased += reached is not None
+        for indv, (action_plan, opp_plan) in zip(population.individuals, shifted):
+            assert [int(a) for a in indv.action_plan[:-1]] == [int(a) for a in action_plan]
+            assert [int(a) for a in indv.opp_plan[:-1]] == [int(a) for a in opp_plan]
+            board = replay(population.board, population.player, action_plan, opp_plan)
+            assert (int(indv.action_plan[-1]), int(indv.opp_plan[-1])) == greedy_pair(board, population.player)
+        check_fitness(population)
+    assert rebased, 'the trie was never rebased'
+
+    # Arena's turn order: evolve, the own move (select_and_execute_individual shifts the plans), the opponent's
+    # reply and evolve again, which must continue from the subtree of the reply.
+    kept = 0
+    for move in range(MOVES):
+        population.evolve()
+        root = population.trie.root
+        action = population.select_and_execute_individual()
+        replies = root.children[action].children if action in root.children else {}  # {}: a random move.
+        valid = np.where(game.getValidMoves(population.board.pieces, -population.player) == 1)[0]
+        planned = [a for a in valid if a in replies]  # the opponent's plans may hold stale, invalid replies.
+        reply = planned[0] if planned else valid[0]
+        population.board.make_move((int(reply) // 6, int(reply) % 6), -population.player)
+        population.evolve()
+        if planned:
+            # replies[reply], or the same position on another path (a stale opponent move is a no-op).
+            nodes, subtree = [root], set()
+            while nodes:
+                node = nodes.pop()
+                subtree.add(id(node))
+                nodes.extend(node.children.values())
+            assert id(population.trie.root) in subtree, 'the trie was not rebased after the reply'
+            kept += 1
+        assert np.array_equal(population.trie.root.board.pieces, population.board.pieces)
+    assert kept, 'no reply was in the trie'
+    print('{}: plans, fitness and trie paths match the replay'.format(store.__name__))
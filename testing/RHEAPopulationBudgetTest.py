@@ -0,0 +1,84 @@
+import random
+import time
+
+import numpy as np
+import torch
+from torch.utils.tensorboard import SummaryWriter
+
+from core_game.utils import dotdict
+from deep_rhea.RHEAArrayPopulation import RHEAArrayPopulation
+from deep_rhea.RHEAPopulation import RHEAPopulation
+from othello.OthelloGame import OthelloGame
+from othello.OthelloLogic import Board
+from othello.pytorch import NNet
+
+# Checks the anytime budgets of RHEAPopulation.evolve with the list and the array store: an evaluation budget is
+# never exceeded (counting the boards given to the network), a time budget stops the search within one batched
+# evaluation of the deadline, and evolve_stats reports the partial generation (children) of an interrupted search.
+EVALUATION_BUDGETS = [1, 30, 100, 250]
+TIME_BUDGETS = [0.05, 0.2, 0.5]
+SLACK = 0.05  # seconds allowed past the deadline, besides the longest batched evaluation.
+
+game = OthelloGame(n=6)
+NNet.args.cuda = False
+torch.manual_seed(0)
+nnet = NNet.NNetWrapper(game, SummaryWriter(comment='PopulationBudgetTest'))
+
+
+class CountingNet:
+    """ nnet counting the boards it evaluates and timing its longest predict_batch. """
+
+    def __init__(self):
+        self.boards = 0
+        self.longest = 0.0
+
+    def predict(self, board):
+        pis, vs = self.predict_batch(board[np.newaxis])
+        return pis[0], vs[:1]
+
+    def predict_batch(self, boards):
+        start = time.perf_counter()
+        result = nnet.predict_batch(boards)
+        self.longest = max(self.longest, time.perf_counter() - start)
+        self.boards += len(boards)
+        return result
+
+
+def plans(population):
+    return [(list(indv.action_plan), list(indv.opp_plan)) for indv in population.individuals]
+
+
+args = dotdict({
+    'NUM_OF_INDIVIDUALS': 50,
+    'INDIVIDUAL_LENGTH': 10,
+    'NUM_OF_BEST_INDIVIDUALS': 2,
+    'MAX_GENERATION_BUDGET': 1000,
+    'MUTATION_CHANCE': 0.7,
+    'CROSSOVER_MUTATIONS': 3,
+})
+
+for store in [RHEAPopulation, RHEAArrayPopulation]:
+    random.seed(0)
+    np.random.seed(0)
+    counting = CountingNet()
+    population = store(game=game, nnet=counting, args=args, board=Board(6))
+
+    for budget in EVALUATION_BUDGETS:
+        before, boards = plans(population), counting.boards
+        population.evolve(evaluation_budget=budget)
+        stats = population.evolve_stats
+        print('{}: evaluation budget {}: {}'.format(store.__name__, budget, dict(stats)))
+        assert counting.boards - boards <= stats.evaluations <= budget  # the symmetry cache serves some of them.
+        if stats.generations == 0 and stats.children == 0:
+            assert plans(population) == before, 'the population changed in an unreported generation'
+
+    for budget in TIME_BUDGETS:
+        counting.longest = 0.0
+        start = time.perf_counter()
+        population.evolve(time_budget=budget)
+        seconds = time.perf_counter() - start
+        stats = population.evolve_stats
+        print('{}: time budget {}: {}, longest evaluation {:.3f} s'.format(store.__name__, budget, dict(stats),
+                                                                            counting.longest))
+        assert seconds <= budget + counting.longest + SLACK, seconds
+        assert stats.generations < args.MAX_GENERATION_BUDGET
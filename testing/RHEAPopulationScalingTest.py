@@ -0,0 +1,47 @@
+import random
+import time
+
+import numpy as np
+import torch
+from torch.utils.tensorboard import SummaryWriter
+
+from core_game.utils import dotdict
+from deep_rhea.RHEAArrayPopulation import RHEAArrayPopulation
+from deep_rhea.RHEAPopulation import RHEAPopulation
+from othello.OthelloGame import OthelloGame
+from othello.OthelloLogic import Board
+from othello.pytorch import NNet
+
+# Evolves populations of 50, 200 and 500 individuals with the list store (RHEAPopulation) and the array store
+# (RHEAArrayPopulation) and reports the seconds per generation, and checks that the first action of every
+# individual of the array store is valid.
+SIZES = [50, 200, 500]
+GENERATIONS = 3
+
+game = OthelloGame(n=6)
+NNet.args.cuda = False
+writer = SummaryWriter(comment='PopulationScalingTest')
+torch.manual_seed(0)
+nnet = NNet.NNetWrapper(game, writer)
+
+for size in SIZES:
+    args = dotdict({
+        'NUM_OF_INDIVIDUALS': size,
+        'INDIVIDUAL_LENGTH': 10,
+        'NUM_OF_BEST_INDIVIDUALS': 2,
+        'MAX_GENERATION_BUDGET': GENERATIONS,
+        'MUTATION_CHANCE': 0.7,
+        'CROSSOVER_MUTATIONS': 3,
+    })
+    for store in [RHEAPopulation, RHEAArrayPopulation]:
+        random.seed(0)
+        np.random.seed(0)
+        population = store(game=game, nnet=nnet, args=args, board=Board(6))
+        start = time.perf_counter()
+        population.evolve()
+        per_generation = (time.perf_counter() - start) / GENERATIONS
+        print('{} individuals, {}: {:.2f} s/generation, best fitness {:.3f}'.format(
+            size, store.__name__, per_generation, float(np.ravel(population.individuals[0].fitness)[0])))
+
+    valid = game.getValidMoves(population.board.pieces, population.player)
+    assert all(valid[action] for action in population.genes[:, 0, 0])
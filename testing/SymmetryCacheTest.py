@@ -0,0 +1,68 @@
+import numpy as np
+import torch
+from torch.utils.tensorboard import SummaryWriter
+
+from alpha_zero.MCTS import MCTS
+from core_game.utils import dotdict
+from deep_rhea.RHEAPopulation import RHEAPopulation
+from othello.OthelloGame import OthelloGame
+from othello.OthelloLogic import Board
+from othello.pytorch import NNet
+
+# The searches evaluate the 8 symmetric variants of a position with one forward pass by default: MCTS and
+# RHEAPopulation put a symmetry cache in front of the network (whose own cache is off by default). The policy of
+# every variant is the policy of the evaluated variant mapped to its orientation.
+game = OthelloGame(n=6)
+NNet.args.cuda = False
+torch.manual_seed(0)
+nnet = NNet.NNetWrapper(game, SummaryWriter(comment='SymmetryCacheTest'))
+
+
+class CountingNet:
+    """ nnet counting the boards it evaluates. """
+
+    def __init__(self):
+        self.boards = 0
+
+    def predict(self, board):
+        pis, vs = self.predict_batch(board[np.newaxis])
+        return pis[0], vs[:1]
+
+    def predict_batch(self, boards):
+        self.boards += len(boards)
+        return nnet.predict_batch(boards)
+
+
+board = Board(6)
+for action, player in [(13, 1), (19, -1), (25, 1), (7, -1)]:  # a position without symmetries
+    board.make_move((action // 6, action % 6), player)
+variants = np.stack([sym for sym, _ in game.getSymmetries(board.pieces, np.zeros(game.getActionSize()))])
+assert len({variant.tobytes() for variant in variants}) == 8
+
+counting = CountingNet()
+mcts = MCTS(game, counting, dotdict({'numMCTSSims': 2, 'cpuct': 1.0}))
+results = [mcts.evaluator.predict(variant) for variant in variants]
+assert counting.boards == 1, counting.boards
+_, canonical, _ = game.getCanonicalSymmetry(variants[0])
+pi, v = nnet.predict(canonical)
+for variant, (variant_pi, variant_v) in zip(variants, results):
+    _, _, t = game.getCanonicalSymmetry(variant)
+    assert np.allclose(variant_pi, game.untransformPolicy(pi, t), atol=1e-6) and np.allclose(variant_v, v, atol=1e-6)
+print('MCTS: 8 symmetric boards, {} forward pass'.format(counting.boards))
+
+counting = CountingNet()
+args = dotdict({'NUM_OF_INDIVIDUALS': 4, 'INDIVIDUAL_LENGTH': 3, 'NUM_OF_BEST_INDIVIDUALS': 1,
+                'MAX_GENERATION_BUDGET': 1, 'MUTATION_CHANCE': 0.7, 'CROSSOVER_MUTATIONS': 1})
+population = RHEAPopulation(game=game, nnet=counting, args=args, board=board)
+boards = counting.boards
+population.evaluator.predict_batch(variants)
+population.evaluator.predict_batch(variants)
+assert counting.boards - boards <= 1, counting.boards - boards  # 0 if the plans met the position already.
+print('RHEAPopulation: 8 symmetric boards twice, {} forward pass'.format(counting.boards - boards))
+
+counting = CountingNet()
+mcts = MCTS(game, counting, dotdict({'numMCTSSims': 2, 'cpuct': 1.0, 'evalCacheBytes': 0}))
+for variant in variants:
+    mcts.evaluator.predict(variant)
+assert counting.boards == 8
+print('MCTS without symmetry cache: {} forward passes'.format(counting.boards))